@@ -0,0 +1,169 @@
+"""关键帧动画引擎：动画以数据声明，按经过时间一次性求值所有角色的关节角度"""
+import numpy as np
+
+# 动画通道：各部件角度 + 整体偏移
+PARTS = ('head', 'neck', 'body', 'left_arm', 'right_arm', 'left_leg', 'right_leg')
+CHANNELS = PARTS + ('offset_x', 'offset_y')
+CHANNEL_INDEX = {name: i for i, name in enumerate(CHANNELS)}
+
+# 缓动函数（输入输出均为 0~1 的数组）
+EASINGS = {
+    'linear': lambda p: p,
+    'step': lambda p: np.zeros_like(p),
+    'smooth': lambda p: p * p * (3 - 2 * p),
+    'sine': lambda p: 0.5 - 0.5 * np.cos(np.pi * p),
+}
+
+# 动画声明：tracks 为 {通道: [(时间ms, 值[, 缓动]), ...]}，缓动作用于该关键帧到下一关键帧
+ANIMATIONS = {
+    'wave': {
+        'duration': 1200,
+        'tracks': {
+            'right_arm': [(0, -90, 'sine'), (300, -45, 'sine'), (600, -90, 'sine'),
+                          (900, -135, 'sine'), (1200, -90)],
+            'head': [(0, 0, 'sine'), (300, 5, 'sine'), (600, 0, 'sine'), (900, -5, 'sine'), (1200, 0)],
+            'left_arm': [(0, 0)],
+            'body': [(0, 0)],
+            'left_leg': [(0, 0)],
+            'right_leg': [(0, 0)],
+        },
+    },
+    'smile': {
+        'duration': 800,
+        'tracks': {
+            # 抖动：阶跃关键帧模拟随机晃动
+            'offset_x': [(0, 2, 'step'), (100, -1, 'step'), (200, 1, 'step'), (300, -2, 'step'),
+                         (400, 2, 'step'), (500, 0, 'step'), (600, -1, 'step'), (700, 1, 'step'), (800, 0)],
+            'offset_y': [(0, -1, 'step'), (100, 2, 'step'), (200, -2, 'step'), (300, 1, 'step'),
+                         (400, 0, 'step'), (500, -1, 'step'), (600, 2, 'step'), (700, -1, 'step'), (800, 0)],
+        },
+        'emotion': {'text': '😄', 'duration': 2000},
+    },
+    'nod': {
+        'duration': 2000,
+        'tracks': {
+            'head': [(0, 0, 'smooth'), (1000, 20, 'smooth'), (2000, 0)],
+            'neck': [(0, 0, 'smooth'), (1000, 10, 'smooth'), (2000, 0)],
+        },
+    },
+    'breath': {
+        'duration': 3000,
+        'loop': True,
+        'tracks': {
+            'body': [(0, 0, 'sine'), (750, 1, 'sine'), (1500, 0, 'sine'), (2250, -1, 'sine'), (3000, 0)],
+            'head': [(0, 0, 'sine'), (750, 0.6, 'sine'), (1500, 0, 'sine'), (2250, -0.6, 'sine'), (3000, 0)],
+            'left_arm': [(0, 0, 'sine'), (750, 2, 'sine'), (1500, 0, 'sine'), (2250, -2, 'sine'), (3000, 0)],
+            'right_arm': [(0, 0, 'sine'), (750, 2, 'sine'), (1500, 0, 'sine'), (2250, -2, 'sine'), (3000, 0)],
+            'offset_y': [(0, 0, 'sine'), (750, 2, 'sine'), (1500, 0, 'sine'), (2250, 2, 'sine'), (3000, 0)],
+        },
+    },
+}
+
+
+def sample_track(keys, times):
+    """在给定时间点上对一条关键帧轨道求值"""
+    keys = sorted(keys, key=lambda k: k[0])
+    key_times = np.array([k[0] for k in keys], dtype=np.float64)
+    key_values = np.array([k[1] for k in keys], dtype=np.float64)
+    if len(keys) == 1:
+        return np.full(len(times), key_values[0])
+
+    seg = np.clip(np.searchsorted(key_times, times, side='right') - 1, 0, len(keys) - 2)
+    span = np.maximum(key_times[seg + 1] - key_times[seg], 1e-9)
+    progress = np.clip((times - key_times[seg]) / span, 0.0, 1.0)
+
+    # 按缓动类型分组计算
+    eased = np.empty_like(progress)
+    easing_names = np.array([k[2] if len(k) > 2 else 'linear' for k in keys[:-1]])
+    seg_easing = easing_names[seg]
+    for name in np.unique(seg_easing):
+        sel = seg_easing == name
+        eased[sel] = EASINGS[name](progress[sel])
+
+    return key_values[seg] + (key_values[seg + 1] - key_values[seg]) * eased
+
+
+class AnimationEngine:
+    """把声明式动画编译成采样表，按时间批量求值"""
+
+    def __init__(self, animations=None, sample_ms=10):
+        self.animations = ANIMATIONS if animations is None else animations
+        self.sample_ms = sample_ms
+        self._compile()
+
+    def _compile(self):
+        # 0 号片段为空闲状态：不驱动任何通道
+        names = ['idle'] + [name for name in self.animations if name != 'idle']
+        self.index = {name: i for i, name in enumerate(names)}
+
+        tables = []
+        offsets, lengths, durations, loops, masks = [], [], [], [], []
+        offset = 0
+        for name in names:
+            anim = self.animations.get(name, {'duration': self.sample_ms, 'loop': True, 'tracks': {}})
+            duration = float(anim['duration'])
+            count = int(np.ceil(duration / self.sample_ms)) + 1
+            times = np.minimum(np.arange(count) * self.sample_ms, duration)
+
+            table = np.zeros((count, len(CHANNELS)), dtype=np.float32)
+            mask = np.zeros(len(CHANNELS), dtype=bool)
+            for channel, keys in anim.get('tracks', {}).items():
+                ch = CHANNEL_INDEX[channel]
+                table[:, ch] = sample_track(keys, times)
+                mask[ch] = True
+
+            tables.append(table)
+            offsets.append(offset)
+            lengths.append(count)
+            durations.append(duration)
+            loops.append(bool(anim.get('loop', False)))
+            masks.append(mask)
+            offset += count
+
+        self.table = np.concatenate(tables)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.durations = np.array(durations, dtype=np.float64)
+        self.loops = np.array(loops, dtype=bool)
+        self.masks = np.array(masks, dtype=bool)
+
+    def evaluate(self, now_ms, clips, starts, base):
+        """求值所有角色的通道值
+
+        clips: 片段编号 (N,)；starts: 开始时间ms (N,)；base: 基础姿势 (N, C)
+        返回 (通道值 (N, C), 是否播放完毕 (N,))
+        """
+        clips = np.asarray(clips, dtype=np.int64)
+        elapsed = now_ms - np.asarray(starts, dtype=np.float64)
+        durations = self.durations[clips]
+        loops = self.loops[clips]
+
+        finished = ~loops & (elapsed >= durations)
+        elapsed = np.where(loops, np.mod(elapsed, durations), np.clip(elapsed, 0, durations))
+
+        pos = elapsed / self.sample_ms
+        last = self.lengths[clips] - 1
+        lo = np.minimum(pos.astype(np.int64), last)
+        hi = np.minimum(lo + 1, last)
+        frac = (pos - lo)[:, None].astype(np.float32)
+
+        rows = self.offsets[clips]
+        values = self.table[rows + lo] * (1 - frac) + self.table[rows + hi] * frac
+        values = np.where(self.masks[clips] & ~finished[:, None], values, base)
+        return values, finished
+
+    def apply(self, characters, now_ms):
+        """根据当前时间更新所有角色姿势，返回通道值数组"""
+        if not characters:
+            return np.zeros((0, len(CHANNELS)), dtype=np.float32)
+
+        clips = [self.index.get(c.current_animation, 0) for c in characters]
+        starts = [c.animation_start for c in characters]
+        base = np.stack([c.pose for c in characters])
+        values, finished = self.evaluate(now_ms, clips, starts, base)
+
+        for character, row, done in zip(characters, values.tolist(), finished.tolist()):
+            if done:
+                character.stop_animation()
+            character.apply_channels(row, now_ms)
+        return values
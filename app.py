@@ -3,15 +3,29 @@ import os
 import pyttsx3
 import subprocess
 import json
+import threading
+import asyncio
+import time
+from concurrent.futures import wait as wait_futures
 from pathlib import Path
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from asset_index import get_index
+from encoders import available_encoders, DEFAULT_ENCODER
+from renderer import render_video, parse_action, RENDER_PROFILES, DEFAULT_PROFILE
+from palette import PALETTES
+from transitions import TRANSITIONS, DEFAULT_TRANSITION
+from camera import CAMERA_MOTIONS, DEFAULT_CAMERA
+from scene_file import list_scenes
+from tts_pool import get_pool, TTS_TIMEOUT
+from audio_mixer import ffmpeg_available
 
 # 全局变量
 avatars = []
 voices = []
 default_avatar = None
+render_cancel_events = {}  # 会话 -> 渲染取消标记
+tts_preview_jobs = {}  # 会话 -> 正在进行的试听合成
+RENDER_LOG = os.environ.get("TTPV_RENDER_LOG")  # 设置后每次渲染的报告追加到该 JSONL 文件
+CANCEL_POLL_SECONDS = 0.2  # 等待配音合成时检查取消的间隔
 
 def parse_script(text):
     """解析脚本格式文本 '角色::文本' 到列表"""
@@ -82,14 +96,21 @@ def load_char_config(char, configs):
     return [voices[0].name if voices else "", 200, 1.0, "", default_avatar, f"assets/avatar/{default_avatar}"]
 
 def get_asset_files(folder):
-    """获取指定文件夹下的所有文件"""
-    path = Path(folder)
-    if not path.exists():
-        return []
-    return [f.name for f in path.glob('*') if f.is_file()]
+    """获取指定资源目录下的所有文件（来自共享资源索引，不解码图片）"""
+    return get_index().list(Path(folder).name)
+
+def format_progress(progress):
+    """格式化渲染进度信息"""
+    if progress['status'] != 'running':
+        return progress['message']
+    return (f"{progress['message']} | {progress['fps']:.0f} 帧/秒 | "
+            f"剩余约 {progress['eta']:.1f} 秒")
 
-def generate_video(script_data, tts_configs, background):
-    """生成视频"""
+def generate_video(script_data, tts_configs, background, scene_name=None, profile=DEFAULT_PROFILE,
+                   encoder=DEFAULT_ENCODER, x264_preset="veryfast", x264_crf=23, transition=DEFAULT_TRANSITION,
+                   typewriter=False, show_cast=True, palette="", voiceover=False, music="", music_volume=1.0,
+                   camera=DEFAULT_CAMERA, encode_process=False, request: gr.Request = None):
+    """生成视频，逐步产出 (状态信息, 预览帧, 视频路径, 渲染报告)"""
     if hasattr(script_data, 'values'):
         data = script_data.values.tolist()
     elif not isinstance(script_data, list):
@@ -97,110 +118,96 @@ def generate_video(script_data, tts_configs, background):
     else:
         data = script_data
         
-    if not data:
-        return "没有台词数据"
-        
-    if not background:
-        return "请选择背景图片"
-        
-    width, height = 1280, 720
-    fps = 30
-    font_color = (255, 255, 255)
-    
-    bg_path = f'assets/background/{background}'
-    
-    Path("movies").mkdir(parents=True, exist_ok=True)
-    
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video_path = 'movies/scene.mp4'
-    out = cv2.VideoWriter(video_path, fourcc, fps, (width, height))
+    if hasattr(tts_configs, 'values'):
+        configs = tts_configs.values.tolist()
+    else:
+        configs = tts_configs or []
     
-    if not out.isOpened():
-        return "视频写入器初始化失败"
+    # 每个会话一个取消标记，取消按钮在两句台词之间生效
+    session = request.session_hash if request else None
+    cancel_event = threading.Event()
+    render_cancel_events[session] = cancel_event
     
     try:
-        bg = cv2.imread(bg_path)
-        if bg is None:
-            return f"背景图片加载失败: {bg_path}"
-        bg = cv2.resize(bg, (width, height))
-        
-        # 创建角色立绘字典
-        avatars_dict = {}
-        if hasattr(tts_configs, 'values'):
-            configs = tts_configs.values.tolist()
-        else:
-            configs = tts_configs
-            
-        for config in configs:
-            if config[4]:  # 如果有立绘配置
-                char_name = config[0]
-                avatar_file = config[4]
-                avatar_path = f'assets/avatar/{avatar_file}'
-                avatar = cv2.imread(avatar_path, cv2.IMREAD_UNCHANGED)
-                if avatar is not None:
-                    avatar_height = int(height * 0.8)
-                    aspect_ratio = avatar.shape[1] / avatar.shape[0]
-                    avatar_width = int(avatar_height * aspect_ratio)
-                    avatars_dict[char_name] = cv2.resize(avatar, (avatar_width, avatar_height))
-        
-        for line in data:
-            if len(line) < 3 or not line[1].strip():
+        preview = None
+        voice_clips = None
+        if voiceover:
+            for message, voice_clips in synthesize_voices(data, configs, cancel_event):
+                yield message, None, None, None
+            if voice_clips is None:
+                return
+        encoder_options = {"preset": x264_preset, "crf": int(x264_crf)} if encoder == "ffmpeg" else {}
+        if encode_process:
+            encoder_options["process"] = True
+        for progress in render_video(data, configs, background, scene_name, profile, cancel_event,
+                                     encoder, encoder_options, report_log=RENDER_LOG, transition=transition,
+                                     typewriter=typewriter, show_cast=show_cast, palette=palette or None,
+                                     voice_clips=voice_clips, music=music or None, music_volume=music_volume,
+                                     camera=camera):
+            if progress.get('preview') is not None:
+                preview = progress['preview']
+            # PNG 序列输出为目录，不送入视频预览
+            video_path = progress.get('video_path')
+            if video_path and not Path(video_path).is_file():
+                video_path = None
+            yield format_progress(progress), preview, video_path, progress.get('report')
+    finally:
+        if render_cancel_events.get(session) is cancel_event:
+            del render_cancel_events[session]
+
+def synthesize_voices(data, configs, cancel_event):
+    """在语音合成进程池中为每句台词生成配音，产出 (状态信息, 配音路径列表)
+
+    路径列表与台词逐行对应，合成完成前为 None；取消或失败时最后一条的列表也为 None。
+    音量在混音时按角色配置施加，这里统一以原始音量合成。动作标签与渲染时一样先去掉，不会被读出来。
+    """
+    pool = get_pool()
+    voice_config = {config[0]: (config[1], config[2]) for config in configs if config[1]}
+    futures = []
+    for line in data:
+        text = parse_action(line[2])[0] if len(line) >= 3 and line[2] else ""
+        config = voice_config.get(line[1]) if text else None
+        futures.append(pool.submit(config[0], config[1], 1.0, text) if config else None)
+
+    clips = []
+    total = sum(1 for future in futures if future is not None)
+    try:
+        for future in futures:
+            if cancel_event.is_set():
+                yield "已取消配音合成", None
+                return
+            if future is None:
+                clips.append(None)
                 continue
-                
-            char_name = line[1]
-            text = line[2]
-            
-            frame = bg.copy()
-            
-            # 使用对应角色的立绘
-            if char_name in avatars_dict:
-                avatar = avatars_dict[char_name]
-                avatar_x = 50
-                avatar_y = height - avatar.shape[0]
-                
-                if avatar.shape[2] == 4:
-                    alpha = avatar[:, :, 3] / 255.0
-                    for c in range(3):
-                        frame[avatar_y:avatar_y+avatar.shape[0], 
-                              avatar_x:avatar_x+avatar.shape[1], c] = \
-                            frame[avatar_y:avatar_y+avatar.shape[0], 
-                                  avatar_x:avatar_x+avatar.shape[1], c] * (1-alpha) + \
-                            avatar[:, :, c] * alpha
-                else:
-                    frame[avatar_y:avatar_y+avatar.shape[0], 
-                          avatar_x:avatar_x+avatar.shape[1]] = avatar[:, :, :3]
-            
-            overlay = frame.copy()
-            cv2.rectangle(overlay, (50, height-150), (width-50, height-50), (0,0,0), -1)
-            frame = cv2.addWeighted(overlay, 0.5, frame, 0.5, 0)
-            
-            pil_im = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            draw = ImageDraw.Draw(pil_im)
-            
-            name_font = ImageFont.truetype('assets/fonts/AlibabaPuHuiTi-3-55-Regular.ttf', 36)
-            text_font = ImageFont.truetype('assets/fonts/AlibabaPuHuiTi-3-55-Regular.ttf', 32)
-            draw.text((70, height-120), char_name, font=name_font, fill=font_color)
-            draw.text((70, height-80), text, font=text_font, fill=font_color)
-            
-            frame = cv2.cvtColor(np.array(pil_im), cv2.COLOR_RGB2BGR)
-            
-            for _ in range(int(fps * 2)):
-                out.write(frame)
-                
-        out.release()
-        
-        if not Path(video_path).exists():
-            return "视频文件未生成"
-        if Path(video_path).stat().st_size == 0:
-            return "视频文件大小为0"
-            
-        return f"视频已生成: {video_path}"
-        
-    except Exception as e:
-        return f"生成失败: {str(e)}"
+            # 分片等待，合成期间也能及时响应取消
+            deadline = time.monotonic() + TTS_TIMEOUT
+            while not wait_futures([future], timeout=CANCEL_POLL_SECONDS).done:
+                if cancel_event.is_set():
+                    yield "已取消配音合成", None
+                    return
+                if time.monotonic() >= deadline:
+                    yield f"语音合成超时（{TTS_TIMEOUT} 秒）", None
+                    return
+            try:
+                clips.append(str(future.result()))
+            except RuntimeError as e:
+                yield str(e), None
+                return
+            done = sum(1 for clip in clips if clip)
+            yield f"合成配音 {done}/{total}", None
     finally:
-        if out.isOpened():
-            out.release()
+        for future in futures:
+            if future is not None and not future.done():
+                pool.cancel(future)
+    yield f"配音已合成 {total} 句", clips
+
+def cancel_render(request: gr.Request = None):
+    """取消当前会话正在进行的渲染"""
+    session = request.session_hash if request else None
+    if session in render_cancel_events:
+        render_cancel_events[session].set()
+        return "正在取消..."
+    return "没有正在进行的渲染"
 
 def create_interface():
     global avatars, voices, default_avatar
@@ -213,19 +220,33 @@ def create_interface():
     default_background = backgrounds[0] if backgrounds else None
     default_avatar = "avatar_1.png" if "avatar_1.png" in avatars else avatars[0] if avatars else None
 
-    def preview_tts(char, voice_name, rate, volume, text):
-        if not char or not voice_name:
-            return
-        
-        engine = pyttsx3.init()
-        for voice in voices:
-            if voice.name == voice_name:
-                engine.setProperty('voice', voice.id)
-                break
-        engine.setProperty('rate', int(rate))
-        engine.setProperty('volume', float(volume))
-        engine.say(text)
-        engine.runAndWait()
+    async def preview_tts(char, voice_name, rate, volume, text, request: gr.Request = None):
+        """在语音合成进程池中合成试听音频，返回 WAV 路径；同一会话的新请求会取消上一个"""
+        if not char or not voice_name or not text:
+            return None
+
+        pool = get_pool()
+        session = request.session_hash if request else None
+        previous = tts_preview_jobs.pop(session, None)
+        if previous is not None:
+            pool.cancel(previous)
+        future = pool.submit(voice_name, rate, volume, text)
+        tts_preview_jobs[session] = future
+        try:
+            return str(await asyncio.wait_for(asyncio.wrap_future(future), TTS_TIMEOUT))
+        except asyncio.TimeoutError:
+            pool.cancel(future)
+            raise gr.Error(f"语音合成超时（{TTS_TIMEOUT} 秒）")
+        except asyncio.CancelledError:
+            if future.cancelled():
+                return None  # 被同一会话的新试听请求取代
+            pool.cancel(future)  # 请求本身被取消（如页面关闭），同时取消合成
+            raise
+        except RuntimeError as e:
+            raise gr.Error(str(e))
+        finally:
+            if tts_preview_jobs.get(session) is future:
+                del tts_preview_jobs[session]
         
     def update_char_list(data):
         chars = get_unique_characters(data)
@@ -344,6 +365,12 @@ def create_interface():
                     )
                     preview_btn = gr.Button("预览")
                     save_config_btn = gr.Button("保存配置")
+                preview_audio = gr.Audio(
+                    label="试听",
+                    type="filepath",
+                    autoplay=True,
+                    interactive=False
+                )
 
         # 4. 视频控制面板
         with gr.Row():
@@ -365,8 +392,91 @@ def create_interface():
                     allow_custom_value=False,
                     interactive=True
                 )
-                generate_btn = gr.Button("生成视频", variant="primary")
+                scene_select = gr.Dropdown(
+                    label="场景文件（可选，由场景编辑器保存）",
+                    choices=list_scenes(),
+                    value=None,
+                    interactive=True
+                )
+                profile_select = gr.Dropdown(
+                    label="渲染配置",
+                    choices=[(p['label'], name) for name, p in RENDER_PROFILES.items()],
+                    value=DEFAULT_PROFILE,
+                    interactive=True
+                )
+                with gr.Row():
+                    transition_select = gr.Dropdown(
+                        label="台词切换效果",
+                        choices=[(label, name) for name, label in TRANSITIONS.items()],
+                        value=DEFAULT_TRANSITION,
+                        interactive=True
+                    )
+                    typewriter_check = gr.Checkbox(label="打字机效果（逐字显示台词）", value=False)
+                    cast_check = gr.Checkbox(label="全体角色同台（非说话角色变暗）", value=True)
+                with gr.Row():
+                    palette_select = gr.Dropdown(
+                        label="调色板",
+                        choices=[("原始颜色", "")] + [(label, name) for name, (label, _) in PALETTES.items()],
+                        value="",
+                        interactive=True
+                    )
+                    camera_select = gr.Dropdown(
+                        label="镜头运动",
+                        choices=[(label, name) for name, label in CAMERA_MOTIONS.items()],
+                        value=DEFAULT_CAMERA,
+                        interactive=True
+                    )
+                # 混音和封装音轨需要 ffmpeg，没有时禁用音频选项
+                audio_ok = ffmpeg_available()
+                with gr.Row():
+                    voiceover_check = gr.Checkbox(
+                        label="生成配音（按角色音色）" if audio_ok else "生成配音（需要 ffmpeg，未找到）",
+                        value=False,
+                        interactive=audio_ok
+                    )
+                    music_select = gr.Dropdown(
+                        label="背景音乐（assets/music）" if audio_ok else "背景音乐（需要 ffmpeg，未找到）",
+                        choices=[("无", "")] + get_asset_files('assets/music'),
+                        value="",
+                        interactive=audio_ok
+                    )
+                    music_volume = gr.Slider(
+                        label="音乐音量",
+                        minimum=0,
+                        maximum=2,
+                        value=1,
+                        step=0.1,
+                        interactive=True
+                    )
+                with gr.Row():
+                    encoder_select = gr.Dropdown(
+                        label="编码后端",
+                        choices=available_encoders(),
+                        value=DEFAULT_ENCODER,
+                        interactive=True
+                    )
+                    x264_preset = gr.Dropdown(
+                        label="x264 preset（ffmpeg）",
+                        choices=["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow"],
+                        value="veryfast",
+                        interactive=True
+                    )
+                    x264_crf = gr.Slider(
+                        label="CRF（ffmpeg，越小质量越高）",
+                        minimum=14,
+                        maximum=36,
+                        value=23,
+                        step=1,
+                        interactive=True
+                    )
+                    process_check = gr.Checkbox(label="独立编码进程（共享内存传帧）", value=False)
+                with gr.Row():
+                    generate_btn = gr.Button("生成视频", variant="primary")
+                    cancel_btn = gr.Button("取消渲染")
                 output = gr.Textbox(label="输出信息")
+                frame_preview = gr.Image(label="渲染进度预览", type="numpy", height=180)
+                video_output = gr.Video(label="视频预览")
+                report_output = gr.JSON(label="渲染报告")
 
         # 更新立绘预览
         def update_avatar_preview(avatar_name):
@@ -423,13 +533,23 @@ def create_interface():
 
         preview_btn.click(
             fn=preview_tts,
-            inputs=[char_select, voice_select, rate, volume, preview_text]
+            inputs=[char_select, voice_select, rate, volume, preview_text],
+            outputs=[preview_audio]
         )
 
         # 更新生成视频事件
         generate_btn.click(
             fn=generate_video,
-            inputs=[script_table, char_config_table, background_select],
+            inputs=[script_table, char_config_table, background_select, scene_select, profile_select,
+                    encoder_select, x264_preset, x264_crf, transition_select,
+                    typewriter_check, cast_check, palette_select, voiceover_check, music_select, music_volume,
+                    camera_select, process_check],
+            outputs=[output, frame_preview, video_output, report_output]
+        )
+        
+        cancel_btn.click(
+            fn=cancel_render,
+            inputs=None,
             outputs=[output]
         )
 
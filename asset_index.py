@@ -0,0 +1,159 @@
+"""资源索引：记录资源路径、大小、内容哈希和按类型读取的文件头信息，按修改时间增量刷新
+
+图片记录尺寸和透明通道，只读取文件头获得，不解码像素；背景音乐记录时长、声道和采样率，
+只读取 WAV 文件头，其他格式留空（播放时由 ffmpeg 解码）。索引持久化在 assets/.index.json。
+"""
+import hashlib
+import json
+import os
+import wave
+from pathlib import Path
+
+from PIL import Image
+
+ASSETS_ROOT = Path("assets")
+INDEX_VERSION = 2
+
+
+def _hash_file(path):
+    """计算文件内容哈希"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _probe_image(path):
+    """只读文件头获取 (宽, 高, 是否有透明通道)"""
+    try:
+        with Image.open(path) as im:
+            alpha = im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info
+            return im.width, im.height, alpha
+    except OSError:
+        return None, None, False
+
+
+def _probe_image_entry(path):
+    width, height, alpha = _probe_image(path)
+    return {"width": width, "height": height, "alpha": alpha}
+
+
+def _probe_audio(path):
+    """只读 WAV 文件头获取时长、声道和采样率；其他格式不解码，返回空值"""
+    try:
+        with wave.open(str(path), "rb") as f:
+            rate = f.getframerate()
+            return {"duration": f.getnframes() / rate, "channels": f.getnchannels(), "sample_rate": rate}
+    except (wave.Error, EOFError, OSError, ZeroDivisionError):
+        return {"duration": None, "channels": None, "sample_rate": None}
+
+
+# 资源类型 -> 文件头读取函数
+ASSET_PROBES = {
+    "avatar": _probe_image_entry,
+    "background": _probe_image_entry,
+    "music": _probe_audio,
+}
+ASSET_KINDS = tuple(ASSET_PROBES)
+IMAGE_KINDS = ("avatar", "background")
+
+
+class AssetIndex:
+    def __init__(self, root=ASSETS_ROOT, index_file=None):
+        self.root = Path(root)
+        self.index_file = Path(index_file) if index_file else self.root / ".index.json"
+        self.entries = {}  # "类型/文件名" -> 条目
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.index_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self.entries = data.get("entries", {})
+
+    def _save(self):
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": INDEX_VERSION, "entries": self.entries}), encoding="utf-8")
+            os.replace(tmp, self.index_file)
+        except OSError:
+            pass  # 索引只是缓存，写入失败不影响使用
+
+    def refresh(self):
+        """扫描资源目录，只对新增或修改过的文件重新读取文件头和哈希，返回是否有变化"""
+        seen = set()
+        changed = False
+        for kind in ASSET_KINDS:
+            folder = self.root / kind
+            if not folder.exists():
+                continue
+            for item in os.scandir(folder):
+                if not item.is_file() or item.name.startswith("."):
+                    continue
+                seen.add(f"{kind}/{item.name}")
+                changed |= self._update_entry(kind, item.name, item.stat())
+
+        for key in list(self.entries):
+            if key not in seen:
+                del self.entries[key]
+                changed = True
+        if changed:
+            self._save()
+        return changed
+
+    def _update_entry(self, kind, name, stat):
+        """文件大小或修改时间变化时重新读取文件头和哈希，返回是否更新"""
+        key = f"{kind}/{name}"
+        entry = self.entries.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return False
+        path = self.root / kind / name
+        self.entries[key] = {
+            "path": str(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            **ASSET_PROBES.get(kind, _probe_image_entry)(path),
+            "hash": _hash_file(path),
+        }
+        return True
+
+    def list(self, kind, exts=None):
+        """列出某类资源的文件名，可按扩展名过滤"""
+        self.refresh()
+        prefix = f"{kind}/"
+        names = [key[len(prefix):] for key in self.entries if key.startswith(prefix)]
+        if exts:
+            names = [n for n in names if Path(n).suffix.lower() in exts]
+        return sorted(names)
+
+    def get(self, kind, name):
+        """获取资源条目，只检查这一个文件是否变化（不存在返回 None）"""
+        key = f"{kind}/{name}"
+        try:
+            stat = (self.root / kind / name).stat()
+        except OSError:
+            if self.entries.pop(key, None):
+                self._save()
+            return None
+        if self._update_entry(kind, name, stat):
+            self._save()
+        return self.entries[key]
+
+    def content_hash(self, kind, name):
+        """资源内容哈希，可作为缓存键"""
+        entry = self.get(kind, name)
+        return entry["hash"] if entry else None
+
+
+_index = None
+
+def get_index():
+    """进程内共享的资源索引"""
+    global _index
+    if _index is None:
+        _index = AssetIndex()
+    return _index
@@ -0,0 +1,103 @@
+"""原始像素资源库：把背景和立绘按渲染分辨率预先缩放，存为 uint8 的 .npy 文件
+
+渲染时用 np.load(mmap_mode='r') 直接映射文件，不再解码 JPEG/PNG 和缩放；
+多个渲染进程映射同一文件时共享系统页缓存，而不是各自持有一份解码副本。
+文件名包含内容哈希和分辨率，资源修改后自动失效。
+
+预处理: python asset_store.py 1280x720 [320x180 ...]
+"""
+import os
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from asset_index import get_index, IMAGE_KINDS
+
+STORE_ROOT = Path("assets") / ".raw"
+AVATAR_HEIGHT_RATIO = 0.8  # 立绘高度占画面高度的比例
+
+
+def target_shape(kind, name, size):
+    """根据资源索引中的尺寸计算预处理后的 (宽, 高)，无需解码图片"""
+    width, height = size
+    if kind == "background":
+        return width, height
+    entry = get_index().get(kind, name)
+    if not entry or not entry["width"]:
+        return None
+    avatar_height = int(height * AVATAR_HEIGHT_RATIO)
+    return int(avatar_height * entry["width"] / entry["height"]), avatar_height
+
+
+def raw_path(kind, name, size):
+    """预处理文件路径（资源不存在时返回 None）"""
+    content_hash = get_index().content_hash(kind, name)
+    if content_hash is None:
+        return None
+    return STORE_ROOT / kind / f"{Path(name).stem}_{content_hash[:16]}_{size[0]}x{size[1]}.npy"
+
+
+def prepare_asset(kind, name, size):
+    """解码、缩放资源并写入原始像素文件，返回文件路径"""
+    path = raw_path(kind, name, size)
+    shape = target_shape(kind, name, size)
+    if path is None or shape is None:
+        return None
+    if path.exists():
+        return path
+
+    flags = cv2.IMREAD_COLOR if kind == "background" else cv2.IMREAD_UNCHANGED
+    image = cv2.imread(get_index().get(kind, name)["path"], flags)
+    if image is None:
+        return None
+    image = np.ascontiguousarray(cv2.resize(image, shape, interpolation=cv2.INTER_AREA))
+
+    # 先写临时文件再原子替换，多个进程同时预处理也不会读到半个文件
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, image)
+    os.replace(tmp, path)
+    return path
+
+
+def is_prepared(kind, name, size):
+    """资源是否已有对应分辨率的预处理文件"""
+    path = raw_path(kind, name, size)
+    return path is not None and path.exists()
+
+
+def load_raw(kind, name, size):
+    """以只读内存映射方式加载预处理资源，缺失时先生成"""
+    path = prepare_asset(kind, name, size)
+    if path is None:
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def load_background(name, size):
+    """加载缩放到渲染分辨率的背景 (高, 宽, 3) BGR"""
+    return load_raw("background", name, size)
+
+
+def load_avatar(name, size):
+    """加载按渲染分辨率缩放的立绘 (高, 宽, 3/4) BGR(A)"""
+    return load_raw("avatar", name, size)
+
+
+def prepare_all(size):
+    """预处理所有背景和立绘，返回生成的文件数"""
+    count = 0
+    for kind in IMAGE_KINDS:
+        for name in get_index().list(kind, (".png", ".jpg", ".jpeg")):
+            if prepare_asset(kind, name, size):
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:] or ["1280x720"]:
+        w, h = (int(v) for v in arg.lower().split("x"))
+        print(f"{arg}: {prepare_all((w, h))} 个资源已就绪")
@@ -0,0 +1,246 @@
+"""流式混音：把台词配音和背景音乐混成一条音轨，直接经管道送入 ffmpeg 封装
+
+按固定长度的块处理，任何时刻内存中只有当前块、正在播放的配音和背景音乐解码管道，
+与脚本总时长无关，也不生成完整长度的中间 WAV 文件。
+
+- 每段配音做门限 RMS 响度归一化，再乘以角色音量（角色配置的「音量」列）
+- 有人说话时背景音乐按与最近配音的距离平滑压低（ducking）
+- 输出做峰值限制，避免叠加后削波
+"""
+import shutil
+import subprocess
+import wave
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 48000
+CHUNK_SAMPLES = SAMPLE_RATE // 2  # 每块 0.5 秒
+VOICE_LOUDNESS_DB = -20.0  # 配音归一化目标（dBFS）
+MUSIC_LOUDNESS_DB = -28.0  # 背景音乐归一化目标（dBFS）
+DUCK_DB = -12.0  # 说话时背景音乐的衰减
+DUCK_RAMP = 0.25  # 衰减的过渡时长（秒）
+GATE_DB = -50.0  # 响度测量时忽略低于该值的静音块
+PEAK_LIMIT = 0.98
+MUSIC_ROOT = Path("assets") / "music"
+
+
+def db_to_gain(db):
+    return 10.0 ** (db / 20.0)
+
+
+def ffmpeg_available():
+    """配音混音和背景音乐都需要 ffmpeg"""
+    return shutil.which('ffmpeg') is not None
+
+
+def _ffmpeg():
+    binary = shutil.which('ffmpeg')
+    if binary is None:
+        raise RuntimeError("未找到 ffmpeg")
+    return binary
+
+
+def gated_rms_db(samples, block=SAMPLE_RATE // 20):
+    """门限 RMS 响度：按 50ms 分块，忽略静音块（近似 EBU R128 的门限做法）"""
+    samples = samples.reshape(len(samples), -1).mean(axis=1)
+    usable = len(samples) // block * block
+    if usable == 0:
+        blocks = samples[None, :]
+    else:
+        blocks = samples[:usable].reshape(-1, block)
+    power = (blocks.astype(np.float64) ** 2).mean(axis=1)
+    power = power[power > db_to_gain(GATE_DB) ** 2]
+    if len(power) == 0:
+        return None
+    return 10.0 * np.log10(power.mean())
+
+
+def normalize(samples, target_db):
+    """把响度调整到 target_db（原地），静音片段保持不变"""
+    loudness = gated_rms_db(samples)
+    if loudness is not None:
+        samples *= db_to_gain(target_db - loudness)
+    return samples
+
+
+def _decode_ffmpeg(path, channels):
+    """用 ffmpeg 解码为 SAMPLE_RATE 的 float32"""
+    cmd = [_ffmpeg(), '-loglevel', 'error', '-i', str(path),
+           '-f', 'f32le', '-ac', str(channels), '-ar', str(SAMPLE_RATE), 'pipe:1']
+    data = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(data, dtype='<f4').copy()
+
+
+def clip_duration(path):
+    """配音时长（秒），WAV 只读文件头"""
+    try:
+        with wave.open(str(path), 'rb') as f:
+            return f.getnframes() / f.getframerate()
+    except (wave.Error, EOFError):
+        return len(load_clip(path)) / SAMPLE_RATE
+
+
+def load_clip(path):
+    """加载配音为 SAMPLE_RATE 单声道 float32；非 PCM WAV 交给 ffmpeg 解码"""
+    try:
+        with wave.open(str(path), 'rb') as f:
+            width, channels, rate = f.getsampwidth(), f.getnchannels(), f.getframerate()
+            raw = f.readframes(f.getnframes())
+    except (wave.Error, EOFError):
+        return _decode_ffmpeg(path, 1)
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648
+    else:
+        return _decode_ffmpeg(path, 1)
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE and len(samples):
+        # 线性插值重采样，配音片段很短，整段处理即可
+        positions = np.arange(int(len(samples) * SAMPLE_RATE / rate)) * (rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+class MusicStream:
+    """循环播放的背景音乐，由 ffmpeg 边解码边读取"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.gain = 1.0
+        self.process = None
+
+    def measure(self):
+        """流式扫描一遍整首音乐，按门限 RMS 计算归一化增益"""
+        cmd = [_ffmpeg(), '-loglevel', 'error', '-i', str(self.path),
+               '-f', 'f32le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1']
+        total = 0.0
+        count = 0
+        block = SAMPLE_RATE // 20
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE) as process:
+            while True:
+                data = process.stdout.read(block * 4 * 200)
+                if not data:
+                    break
+                samples = np.frombuffer(data[:len(data) // 4 * 4], dtype='<f4')
+                usable = len(samples) // block * block
+                power = (samples[:usable].reshape(-1, block).astype(np.float64) ** 2).mean(axis=1)
+                power = power[power > db_to_gain(GATE_DB) ** 2]
+                total += power.sum()
+                count += len(power)
+        if count:
+            self.gain = db_to_gain(MUSIC_LOUDNESS_DB - 10.0 * np.log10(total / count))
+        return self.gain
+
+    def read(self, n):
+        """读取 n 个立体声采样 (n, 2)"""
+        if self.process is None:
+            cmd = [_ffmpeg(), '-loglevel', 'error', '-stream_loop', '-1', '-i', str(self.path),
+                   '-f', 'f32le', '-ac', '2', '-ar', str(SAMPLE_RATE), 'pipe:1']
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        data = self.process.stdout.read(n * 8)
+        samples = np.zeros((n, 2), dtype=np.float32)
+        got = np.frombuffer(data[:len(data) // 8 * 8], dtype='<f4').reshape(-1, 2)
+        samples[:len(got)] = got
+        return samples
+
+    def close(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+
+class AudioMixer:
+    """按块产出混好的立体声 float32 音频
+
+    clips 为 [(开始秒数, 配音路径, 音量)]；配音在播放到时才加载，播完即释放。
+    """
+
+    def __init__(self, duration, clips, music=None, music_volume=1.0):
+        self.total = int(round(duration * SAMPLE_RATE))
+        self.clips = sorted(clips, key=lambda c: c[0])
+        self.starts = np.array([int(round(c[0] * SAMPLE_RATE)) for c in self.clips], dtype=np.int64)
+        self.ends = self.starts + np.array([int(clip_duration(c[1]) * SAMPLE_RATE) for c in self.clips],
+                                           dtype=np.int64)
+        self.music = MusicStream(music) if music else None
+        self.music_volume = music_volume
+
+    def duck_gain(self, start, n):
+        """背景音乐的衰减包络：按与最近一段配音的距离在 DUCK_RAMP 内线性过渡"""
+        ramp = DUCK_RAMP * SAMPLE_RATE
+        near = (self.starts < start + n + ramp) & (self.ends > start - ramp)
+        gain = np.ones(n, dtype=np.float32)
+        if not near.any():
+            return gain
+        t = np.arange(start, start + n)
+        dist = np.maximum(np.maximum(self.starts[near, None] - t, t - self.ends[near, None]), 0).min(axis=0)
+        depth = np.clip(1.0 - dist / ramp, 0.0, 1.0)
+        gain -= (1.0 - db_to_gain(DUCK_DB)) * depth.astype(np.float32)
+        return gain
+
+    def chunks(self):
+        """逐块产出 (n, 2) float32 音频"""
+        if self.music is not None:
+            music_gain = self.music.measure() * self.music_volume
+        active = {}  # 配音序号 -> 归一化并乘以音量后的采样
+        upcoming = 0
+        try:
+            for start in range(0, self.total, CHUNK_SAMPLES):
+                n = min(CHUNK_SAMPLES, self.total - start)
+                if self.music is not None:
+                    out = self.music.read(n)
+                    out *= (self.duck_gain(start, n) * music_gain)[:, None]
+                else:
+                    out = np.zeros((n, 2), dtype=np.float32)
+
+                # 加载本块内开始的配音
+                while upcoming < len(self.clips) and self.starts[upcoming] < start + n:
+                    _, path, volume = self.clips[upcoming]
+                    active[upcoming] = normalize(load_clip(path), VOICE_LOUDNESS_DB) * volume
+                    upcoming += 1
+
+                voice = np.zeros(n, dtype=np.float32)
+                for index in list(active):
+                    samples = active[index]
+                    clip_start = self.starts[index]
+                    a, b = max(clip_start, start), min(clip_start + len(samples), start + n)
+                    if a < b:
+                        voice[a - start:b - start] += samples[a - clip_start:b - clip_start]
+                    if clip_start + len(samples) <= start + n:
+                        del active[index]
+                out += voice[:, None]
+                np.clip(out, -PEAK_LIMIT, PEAK_LIMIT, out=out)
+                yield out
+        finally:
+            if self.music is not None:
+                self.music.close()
+
+
+def mux_audio(video_path, mixer):
+    """把混音经 stdin 管道送入 ffmpeg，与视频流封装后替换原文件"""
+    video_path = Path(video_path)
+    tmp = video_path.with_name(f"{video_path.stem}.audio{video_path.suffix}")
+    cmd = [
+        _ffmpeg(), '-y', '-loglevel', 'error',
+        '-i', str(video_path),
+        '-f', 'f32le', '-ar', str(SAMPLE_RATE), '-ac', '2', '-i', 'pipe:0',
+        '-map', '0:v', '-map', '1:a', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '160k',
+        '-shortest', '-movflags', '+faststart',
+        str(tmp),
+    ]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for chunk in mixer.chunks():
+            process.stdin.write(memoryview(np.ascontiguousarray(chunk, dtype='<f4')).cast('B'))
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    error = process.stderr.read().decode(errors='replace').strip()
+    if process.wait() != 0:
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"音频封装失败: {error}")
+    tmp.replace(video_path)
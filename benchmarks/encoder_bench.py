@@ -0,0 +1,85 @@
+"""编码后端基准：比较各后端的编码吞吐量和每分钟视频的字节数
+
+用法: python benchmarks/encoder_bench.py --seconds 20 --size 1280x720 --fps 30
+帧内容模拟渲染器输出：每句台词 2 秒静止画面，换句时画面变化。
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import cv2
+import numpy as np
+from encoders import available_encoders, create_encoder
+
+LINE_SECONDS = 2
+
+
+def synthetic_frames(size, fps, seconds, seed=0):
+    """生成模拟台词画面：渐变背景 + 色块立绘 + 对话框文字，每句保持不变"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(40, 200, width, dtype=np.uint8)
+    base = np.dstack([np.tile(gradient, (height, 1))] * 3)
+    base[:, :, 0] = base[:, :, 0][:, ::-1]
+
+    frames_per_line = fps * LINE_SECONDS
+    for line in range(int(np.ceil(seconds / LINE_SECONDS))):
+        frame = base.copy()
+        x = int(rng.integers(0, width // 2))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x, height // 5), (x + width // 4, height), color, -1)
+        cv2.rectangle(frame, (width // 25, height * 4 // 5), (width * 24 // 25, height * 14 // 15), (20, 20, 20), -1)
+        cv2.putText(frame, f"line {line}: " + "text " * int(rng.integers(2, 10)),
+                    (width // 18, height * 8 // 9), cv2.FONT_HERSHEY_SIMPLEX, height / 720, (255, 255, 255), 2)
+        for _ in range(frames_per_line):
+            yield frame
+
+
+def bench(name, size, fps, seconds, options, workdir):
+    frames = list(synthetic_frames(size, fps, seconds))
+    start = time.perf_counter()
+    with create_encoder(name, workdir / f"bench_{name}", size, fps, **options) as encoder:
+        for frame in frames:
+            encoder.write(frame)
+    elapsed = time.perf_counter() - start
+    video_minutes = len(frames) / fps / 60
+    return {
+        'encoder': name,
+        'frames': len(frames),
+        'fps': len(frames) / elapsed,
+        'bytes_per_minute': encoder.output_bytes() / video_minutes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--encoders', nargs='*', default=None, help='默认测试所有可用后端')
+    parser.add_argument('--preset', default='veryfast')
+    parser.add_argument('--crf', type=int, default=23)
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split('x'))
+    names = args.encoders or available_encoders()
+    workdir = Path(tempfile.mkdtemp(prefix='encoder_bench_'))
+    try:
+        print(f"{'encoder':<8} {'frames':>7} {'fps':>9} {'MB/min':>9}")
+        for name in names:
+            options = {'preset': args.preset, 'crf': args.crf} if name == 'ffmpeg' else {}
+            result = bench(name, size, args.fps, args.seconds, options, workdir)
+            print(f"{result['encoder']:<8} {result['frames']:>7} {result['fps']:>9.1f} "
+                  f"{result['bytes_per_minute'] / 1e6:>9.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""渲染基准：用合成脚本跑 render_video，记录性能指标并与基线比较
+
+用法:
+  python benchmarks/render_bench.py                          # 跑默认规模并与基线比较
+  python benchmarks/render_bench.py --sizes 10 100 --profile full
+  python benchmarks/render_bench.py --update-baseline        # 把本次结果保存为基线
+  python benchmarks/render_bench.py --tolerance fps=0.1 peak_rss=0.3
+  python benchmarks/render_bench.py --process                # 在独立进程中编码（共享内存帧环）
+
+每个规模在独立子进程中运行，峰值内存互不影响。任一指标超出容差即以非零状态退出。
+基线与机器相关，需在同一台机器上生成和比较。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'render_baseline.json'
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / 'render_results.json'
+
+# 指标 -> (方向, 默认容差)；方向 1 表示越大越好，-1 表示越小越好
+METRICS = {
+    'fps': (1, 0.15),
+    'wall_time': (-1, 0.20),
+    'peak_rss': (-1, 0.20),
+    'output_bytes': (-1, 0.10),
+}
+
+NAMES = ['爱丽丝', '鲍勃', '卡罗尔', '戴夫', '伊芙', '弗兰克', '格蕾丝', '亨利']
+WORDS = ['今天', '天气', '真好', '我们', '一起', '去', '公园', '散步', '吧', '好啊', '等等', '你看', '那边', 'hello', 'ok']
+
+
+def synthetic_script(size, seed=0):
+    """生成 '角色::文本' 格式的合成脚本：角色数量和台词长度随机变化"""
+    rng = random.Random(seed + size)
+    cast = NAMES[:rng.randint(2, len(NAMES))]
+    lines = []
+    for _ in range(size):
+        text = ''.join(rng.choice(WORDS) for _ in range(rng.randint(1, 15)))
+        lines.append(f"{rng.choice(cast)}::{text}")
+    return '\n'.join(lines), cast
+
+
+def run_case(size, profile, encoder, process=False):
+    """在当前进程中渲染一个规模，返回指标"""
+    from asset_index import get_index
+    from renderer import render_video
+    from telemetry import peak_rss
+
+    stages = {}
+    start = time.perf_counter()
+    text, cast = synthetic_script(size)
+    # 解析逻辑与界面保持一致（app.parse_script），此处内联以免依赖 gradio
+    data = [[str(i), *map(str.strip, line.split('::', 1))] for i, line in enumerate(text.split('\n'), 1)]
+    avatars = get_index().list('avatar')
+    configs = [[name, '', 200, 1.0, avatars[i % len(avatars)]] for i, name in enumerate(cast)]
+    background = get_index().list('background')[0]
+    stages['script'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = None
+    first_progress = None
+    output_path = Path(tempfile.mkdtemp(prefix='render_bench_')) / 'scene'
+    for progress in render_video(data, configs, background, profile=profile, encoder=encoder,
+                                 encoder_options={'process': True} if process else None,
+                                 output_path=output_path, use_cache=False):
+        if first_progress is None:
+            first_progress = time.perf_counter() - start
+        result = progress
+    stages['render'] = time.perf_counter() - start
+    stages['first_progress'] = first_progress
+    # 渲染内部各阶段耗时来自渲染报告
+    report = result['report']
+    for name, stage in report['stages'].items():
+        stages[name] = stage['seconds']
+
+    if result['status'] != 'done':
+        raise RuntimeError(result['message'])
+    wall_time = stages['script'] + stages['render']
+    output = Path(result['video_path'])
+    output_bytes = output.stat().st_size if output.is_file() else 0
+    shutil.rmtree(output_path.parent, ignore_errors=True)
+    return {
+        'lines': size,
+        'frames': result['frames'],
+        'fps': result['frames'] / stages['render'],
+        'wall_time': wall_time,
+        'stages': stages,
+        'peak_rss': peak_rss(),
+        'output_bytes': output_bytes,
+        'cache_hit_rates': report['cache_hit_rates'],
+    }
+
+
+def run_isolated(size, profile, encoder, process=False):
+    """在子进程中运行一个规模"""
+    cmd = [sys.executable, __file__, '--case', str(size), '--profile', profile, '--encoder', encoder]
+    if process:
+        cmd.append('--process')
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"规模 {size} 运行失败:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerances):
+    """与基线比较，返回回归描述列表"""
+    regressions = []
+    for key, current in results['cases'].items():
+        base = baseline.get('cases', {}).get(key)
+        if base is None:
+            continue
+        for metric, (direction, _) in METRICS.items():
+            old, new = base.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if direction * change < -tolerances[metric]:
+                regressions.append(f"{key} 行 {metric}: {old:.4g} -> {new:.4g} ({change:+.1%}，容差 {tolerances[metric]:.0%})")
+    return regressions
+
+
+def parse_tolerances(items):
+    tolerances = {metric: tol for metric, (_, tol) in METRICS.items()}
+    for item in items or []:
+        metric, value = item.split('=', 1)
+        if metric not in METRICS:
+            raise SystemExit(f"未知指标: {metric}（可选 {', '.join(METRICS)}）")
+        tolerances[metric] = float(value)
+    return tolerances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(DEFAULT_SIZES))
+    parser.add_argument('--profile', default='draft')
+    parser.add_argument('--encoder', default='cv2')
+    parser.add_argument('--process', action='store_true', help='在独立进程中编码')
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', nargs='*', help='指标=相对容差，例如 fps=0.1')
+    parser.add_argument('--case', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        os.chdir(ROOT)
+        print(json.dumps(run_case(args.case, args.profile, args.encoder, args.process)))
+        return
+
+    tolerances = parse_tolerances(args.tolerance)
+    results = {
+        'profile': args.profile,
+        'encoder': args.encoder,
+        'process': args.process,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cases': {},
+    }
+    print(f"{'lines':>6} {'frames':>8} {'fps':>9} {'wall s':>8} {'RSS MB':>8} {'out MB':>8}")
+    for size in args.sizes:
+        case = run_isolated(size, args.profile, args.encoder, args.process)
+        results['cases'][str(size)] = case
+        print(f"{size:>6} {case['frames']:>8} {case['fps']:>9.1f} {case['wall_time']:>8.2f} "
+              f"{case['peak_rss'] / 1e6:>8.1f} {case['output_bytes'] / 1e6:>8.2f}")
+
+    args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"结果已写入 {args.output}")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"基线已更新 {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"未找到基线 {args.baseline}，使用 --update-baseline 生成")
+        return
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    if (baseline.get('profile'), baseline.get('encoder'), baseline.get('process', False)) != \
+            (args.profile, args.encoder, args.process):
+        raise SystemExit("基线的渲染配置/编码后端与本次不同，无法比较")
+    regressions = compare(results, baseline, tolerances)
+    if regressions:
+        print("性能回归:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("未发现性能回归")
+
+
+if __name__ == '__main__':
+    main()
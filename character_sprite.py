@@ -0,0 +1,173 @@
+"""角色精灵：头像加简单身体部件的火柴人，按部件角度和偏移绘制到 pygame Surface
+
+只依赖 pygame 本身（不需要窗口和 pygame_gui），场景编辑器和动画烘焙（sprite_baker）共用。
+"""
+import math
+from pathlib import Path
+
+import numpy as np
+import pygame
+
+from animation import ANIMATIONS, CHANNELS, CHANNEL_INDEX, PARTS
+
+class CharacterSprite:
+    def __init__(self, head_image):
+        self.original_file = Path(head_image).name  # 保存原始文件名
+        self.head = pygame.image.load(head_image)
+        self.head = pygame.transform.scale(self.head, (70, 70))
+        
+        # 身体部件颜色和尺寸
+        self.body_color = (60, 60, 60)
+        self.sizes = {
+            'body': (40, 60),
+            'neck': (6, 20),
+            'left_arm': (8, 50),
+            'right_arm': (8, 50),
+            'left_leg': (10, 60),
+            'right_leg': (10, 60)
+        }
+        
+        # 身体部件的相对位置和旋转角度
+        self.parts = {
+            'head': {'pos': [0, -65], 'angle': 0},
+            'neck': {'pos': [0, -40], 'angle': 0},
+            'body': {'pos': [0, 0], 'angle': 0},
+            'left_arm': {'pos': [-20, -30], 'pivot': 'top', 'angle': 0},
+            'right_arm': {'pos': [20, -30], 'pivot': 'top', 'angle': 0},
+            'left_leg': {'pos': [-15, 50], 'angle': 0},
+            'right_leg': {'pos': [15, 50], 'angle': 0}
+        }
+        
+        # 角色名：渲染时按台词中的角色名匹配场景中的站位
+        self.name = Path(head_image).stem
+
+        # 基础位置
+        self.pos = [400, 300]
+        self.base_offset = [0, 0]
+        
+        # 动画系统：基础姿势 + 当前动画片段，由 AnimationEngine 按时间求值
+        self.pose = np.zeros(len(CHANNELS), dtype=np.float32)
+        self.current_animation = None
+        self.animation_start = 0
+        
+        # 表情系统
+        self.emotion_text = None
+        self.emotion_until = 0
+        self._emotion_cache = None
+        self.emotion_font = pygame.font.SysFont('segoe ui emoji', 32)  # 使用系统emoji字体，没有时回退到默认字体
+    
+    def draw(self, screen, body=True):
+        # 计算实际绘制位置
+        center_pos = (self.pos[0] + self.base_offset[0], 
+                     self.pos[1] + self.base_offset[1])
+        
+        # 绘制身体部件（body=False 时只画头部，用于视频中的立绘动画）
+        if body:
+            self._draw_body_part(screen, center_pos, 'body')
+            self._draw_body_part(screen, center_pos, 'neck')
+            self._draw_body_part(screen, center_pos, 'left_leg')
+            self._draw_body_part(screen, center_pos, 'right_leg')
+            self._draw_body_part(screen, center_pos, 'left_arm')
+            self._draw_body_part(screen, center_pos, 'right_arm')
+        
+        # 绘制头部
+        head_pos = self._get_part_pos(center_pos, 'head')
+        head_rotated = pygame.transform.rotate(self.head, self.parts['head']['angle'])
+        head_rect = head_rotated.get_rect(center=head_pos)
+        screen.blit(head_rotated, head_rect)
+        
+        # 绘制表情（如果有）
+        if self.emotion_text:
+            self.draw_emotion(screen)
+    
+    def draw_emotion(self, screen):
+        # 表情文字渲染结果按文本缓存；字体（如回退后的默认字体）中没有的字形会画成方框，这时不画表情
+        if self._emotion_cache is None or self._emotion_cache[0] != self.emotion_text:
+            if None in self.emotion_font.metrics(self.emotion_text):
+                surface = None
+            else:
+                surface = self.emotion_font.render(self.emotion_text, True, (0, 0, 0))
+            self._emotion_cache = (self.emotion_text, surface)
+        emotion_surface = self._emotion_cache[1]
+        if emotion_surface is None:
+            return
+        # 在头顶上方显示（不随动画晃动）
+        head_x, head_y = self._get_part_pos(self.pos, 'head')
+        emotion_pos = (head_x, head_y - self.head.get_height() // 2)
+        screen.blit(emotion_surface, 
+                   emotion_surface.get_rect(midbottom=emotion_pos))
+    
+    def _draw_body_part(self, screen, center_pos, part_name):
+        if part_name not in self.sizes:
+            return
+            
+        width, height = self.sizes[part_name]
+        pos = self._get_part_pos(center_pos, part_name)
+        angle = self.parts[part_name]['angle']
+        
+        # 创建部件表面
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        pygame.draw.rect(surface, self.body_color, (0, 0, width, height))
+        
+        # 处理手臂的特殊旋转
+        if part_name in ['left_arm', 'right_arm']:
+            # 设置旋转中心点在顶部
+            rotated = pygame.transform.rotate(surface, angle)
+            if part_name == 'left_arm':
+                rect = rotated.get_rect(midtop=pos)
+            else:
+                rect = rotated.get_rect(midtop=pos)
+        else:
+            # 其他部件保持中心旋转
+            rotated = pygame.transform.rotate(surface, angle)
+            rect = rotated.get_rect(center=pos)
+        
+        screen.blit(rotated, rect)
+    
+    def _get_part_pos(self, center_pos, part_name):
+        part = self.parts[part_name]
+        angle_rad = math.radians(self.parts['body']['angle'])
+        
+        # 根据身体角度调整部件位置
+        x = part['pos'][0] * math.cos(angle_rad) - part['pos'][1] * math.sin(angle_rad)
+        y = part['pos'][0] * math.sin(angle_rad) + part['pos'][1] * math.cos(angle_rad)
+        
+        return (center_pos[0] + x, center_pos[1] + y)
+    
+    def apply_channels(self, values, now_ms):
+        """写入引擎求得的通道值"""
+        for part_name, angle in zip(PARTS, values):
+            self.parts[part_name]['angle'] = angle
+        self.base_offset = [values[CHANNEL_INDEX['offset_x']], values[CHANNEL_INDEX['offset_y']]]
+        
+        # 表情按绝对时间过期，与帧率无关
+        if self.emotion_text and now_ms >= self.emotion_until:
+            self.emotion_text = None
+    
+    def _reset_pose(self):
+        # 重置所有部件到默认位置（自然站立）
+        self.stop_animation()
+        self.pose[:] = 0
+        for part in self.parts.values():
+            part['angle'] = 0
+        self.base_offset = [0, 0]
+
+    def play_animation(self, action_id, now_ms=None):
+        self.current_animation = action_id
+        self.animation_start = pygame.time.get_ticks() if now_ms is None else now_ms
+        
+        emotion = ANIMATIONS.get(action_id, {}).get('emotion')
+        if emotion:
+            self.emotion_text = emotion['text']
+            self.emotion_until = self.animation_start + emotion['duration']
+
+    def stop_animation(self):
+        self.current_animation = None
+
+    def set_pose(self, pose_data):
+        for part_name, settings in pose_data.items():
+            if part_name in self.parts:
+                for key, value in settings.items():
+                    self.parts[part_name][key] = value
+                if 'angle' in settings:
+                    self.pose[CHANNEL_INDEX[part_name]] = settings['angle']
@@ -0,0 +1,431 @@
+"""逐句合成：静态镜头和镜头运动共用的舞台缓存和逐句、逐帧流程
+
+Stage 按说话角色缓存舞台画面、背景层、镜头运动用的前景层和动画精灵表。
+LinePipeline 负责一句台词的全部帧：过渡段与上一句的画面混合，停留段按帧号推进打字机和动画，
+画面不变的连续帧合并为一次重复写入，调色板量化、放大和编码写出也都在这里统一处理。
+画面来源有两种：StaticFrames 从缓存的舞台整帧出发，只增量重画变化的区域；
+CameraFrames 每帧从放大的背景取景，再叠加缓存的前景层、动画帧和文字。
+"""
+import cv2
+import numpy as np
+
+import sprite_baker
+from camera import composite_layer, foreground_layer, warp
+from glyph_atlas import placements_rect, stamp_glyphs
+from transitions import union_rect
+
+NON_SPEAKER_DIM = 0.55  # 非说话角色立绘的亮度
+
+
+def overlay_image(frame, image, x, y):
+    """将图像叠加到帧上（支持透明通道，超出画面部分裁剪）"""
+    h, w = image.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, frame.shape[1]), min(y + h, frame.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    src = image[y0 - y:y1 - y, x0 - x:x1 - x]
+    dst = frame[y0:y1, x0:x1]
+    if src.shape[2] == 4:
+        alpha = src[:, :, 3:4] / 255.0
+        dst[:] = dst * (1 - alpha) + src[:, :, :3] * alpha
+    else:
+        dst[:] = src[:, :, :3]
+
+
+def dim_avatar(avatar, factor=NON_SPEAKER_DIM):
+    """非说话角色的变暗立绘（保留透明通道）"""
+    dimmed = np.array(avatar)
+    dimmed[:, :, :3] = dimmed[:, :, :3] * factor
+    return dimmed
+
+
+class Stage:
+    """按说话角色缓存的舞台：背景、全部立绘（非说话角色变暗）和半透明对话框
+
+    cast 为 {角色: (立绘, 场景条目)}，cast_files 为角色实际使用的立绘文件，placements 为站位
+    {角色: (立绘, x, y)}。舞台画面已按调色板量化；前景层和精灵表在首次用到时生成。
+    """
+
+    def __init__(self, bg, cast, cast_files, placements, layout, lut, text_color, report, show_cast=True, fps=30):
+        self.bg = bg
+        self.cast = cast
+        self.cast_files = cast_files
+        self.placements = placements
+        self.width, self.height = layout.width, layout.height
+        self.dialog_box = layout.dialog_box
+        self.lut = lut
+        self.text_color = text_color
+        self.report = report
+        self.show_cast = show_cast
+        self.fps = fps
+        self.dimmed = {}  # 角色 -> 变暗的立绘，首次作为非说话角色出场时生成
+        self.stages = {}  # 说话角色 -> 合成好的舞台（背景、全部立绘、对话框）
+        self.backdrops = {}  # 说话角色 -> 背景和其他角色（不含说话角色和对话框），播放动画时使用
+        self.sheets = {}  # (角色, 动画) -> (帧, 左上角x, 左上角y) 或 None
+        self.layers = {}  # 说话角色 -> (舞台前景层, 动画用前景层)，镜头运动时使用
+
+    def avatar_rect(self, speaker):
+        """说话角色立绘的 (x0, y0, x1, y1)，没有立绘时为 None"""
+        if speaker not in self.placements:
+            return None
+        avatar, x, y = self.placements[speaker]
+        return x, y, x + avatar.shape[1], y + avatar.shape[0]
+
+    def shade_box(self, view, x=0, y=0):
+        """把对话框与 view（左上角位于帧的 (x, y)）重叠的部分压暗一半"""
+        box_x0, box_y0, box_x1, box_y1 = self.dialog_box
+        x0, y0 = max(box_x0 - x, 0), max(box_y0 - y, 0)
+        x1, y1 = min(box_x1 - x, view.shape[1]), min(box_y1 - y, view.shape[0])
+        if x0 < x1 and y0 < y1:
+            box = view[y0:y1, x0:x1]
+            np.right_shift(box, 1, out=box)
+
+    def compose_backdrop(self, speaker, base=None):
+        """背景（或 base）加上变暗的非说话角色"""
+        layer = (self.bg if base is None else base).copy()
+        for char_name, (avatar, x, y) in self.placements.items():
+            if char_name == speaker or not self.show_cast:
+                continue
+            if char_name not in self.dimmed:
+                self.dimmed[char_name] = dim_avatar(avatar)
+            overlay_image(layer, self.dimmed[char_name], x, y)
+        return layer
+
+    def backdrop(self, speaker):
+        if speaker not in self.backdrops:
+            self.backdrops[speaker] = self.compose_backdrop(speaker)
+        return self.backdrops[speaker]
+
+    def compose(self, speaker, base=None):
+        """背景（或 base）、全部立绘和对话框"""
+        stage = self.compose_backdrop(speaker, base)
+        # 说话角色最后绘制，位于其他角色之上
+        if speaker in self.placements:
+            avatar, x, y = self.placements[speaker]
+            overlay_image(stage, avatar, x, y)
+        self.shade_box(stage)
+        return stage
+
+    def stage(self, speaker):
+        """按说话角色取缓存的舞台画面（已量化）；同一说话角色的台词只需拷贝一次整帧"""
+        if speaker in self.stages:
+            self.report.cache("stage", True)
+            return self.stages[speaker]
+        self.report.cache("stage", False)
+        stage = self.compose(speaker)
+        if self.lut is not None:
+            self.lut.apply(stage, out=stage)
+        self.stages[speaker] = stage
+        return stage
+
+    def foreground(self, speaker):
+        """镜头运动时的前景层：分别画在纯黑和纯白底上求出预乘颜色和透明度，每个说话角色只求一次"""
+        if speaker in self.layers:
+            self.report.cache("camera_layer", True)
+            return self.layers[speaker]
+        self.report.cache("camera_layer", False)
+        black = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        white = np.full((self.height, self.width, 3), 255, dtype=np.uint8)
+        self.layers[speaker] = (
+            foreground_layer(self.compose(speaker, black), self.compose(speaker, white)),
+            foreground_layer(self.compose_backdrop(speaker, black), self.compose_backdrop(speaker, white)))
+        return self.layers[speaker]
+
+    def sheet(self, speaker, animation):
+        """说话角色的动画精灵表（只画头部，与立绘同高，带场景中的姿势），放在立绘中心；首次使用时烘焙并缓存到磁盘"""
+        key = (speaker, animation)
+        if key not in self.sheets:
+            self.sheets[key] = None
+            if speaker in self.placements:
+                avatar, x, y = self.placements[speaker]
+                entry = self.cast[speaker][1]
+                options = dict(pose=entry.get("parts") if entry else None, fps=self.fps,
+                               head_height=avatar.shape[0], body=False)
+                avatar_file = self.cast_files[speaker]
+                try:
+                    self.report.cache("sprite_sheet", sprite_baker.is_baked(avatar_file, animation, **options))
+                    baked = sprite_baker.bake(avatar_file, animation, **options)
+                except Exception as e:
+                    # 缺少 pygame 或烘焙失败时只显示静态立绘，不影响整个渲染
+                    self.report.count("sprite_sheet_errors")
+                    self.report.info['sprite_sheet_error'] = f"{type(e).__name__}: {e}"
+                    baked = None
+                if baked is not None:
+                    frames, (anchor_x, anchor_y) = baked
+                    self.sheets[key] = (frames, x + avatar.shape[1] // 2 - anchor_x, y + avatar.shape[0] // 2 - anchor_y)
+        return self.sheets[key]
+
+    def redraw_speaker(self, frame, roi, speaker, sprite, glyphs):
+        """在 roi 内重画说话角色：sprite 为 (图像, x, y) 时画动画帧，为 None 时恢复静态舞台；
+        随后补上对话框、文字并量化"""
+        x0, y0, x1, y1 = roi
+        view = frame[y0:y1, x0:x1]
+        if sprite is None:
+            view[:] = self.stage(speaker)[y0:y1, x0:x1]
+        else:
+            image, sx, sy = sprite
+            view[:] = self.backdrop(speaker)[y0:y1, x0:x1]
+            overlay_image(view, image, sx - x0, sy - y0)
+            self.shade_box(view, x0, y0)
+        stamp_glyphs(view, [(mask, x - x0, y - y0) for mask, x, y in glyphs], self.text_color)
+        if self.lut is not None:
+            self.lut.apply(view, out=view)
+
+
+class LinePlan:
+    """一句台词的合成内容：说话角色、名字和台词的字形、立绘区域和动画精灵表"""
+
+    def __init__(self, speaker, name_glyphs, glyphs, avatar_rect, sheet=None):
+        self.speaker = speaker
+        self.name_glyphs = name_glyphs
+        self.glyphs = glyphs
+        self.avatar_rect = avatar_rect
+        self.sheet = sheet  # (帧, 左上角x, 左上角y) 或 None
+
+    def sheet_rect(self):
+        if self.sheet is None:
+            return None
+        frames, x, y = self.sheet
+        return x, y, x + frames.shape[2], y + frames.shape[1]
+
+    def sprite_index(self, held):
+        """停留段第 held 帧对应的动画帧号；没有动画或已播完时为 None"""
+        if self.sheet is None or not 0 <= held < len(self.sheet[0]):
+            return None
+        return held
+
+    def sprite(self, index):
+        """动画帧 (图像, x, y)，index 为 None 时返回 None"""
+        if index is None:
+            return None
+        frames, x, y = self.sheet
+        return frames[index], x, y
+
+
+class StaticFrames:
+    """静态镜头：每句从缓存的舞台整帧出发，之后只增量贴新出现的字、重画动画覆盖的区域"""
+    moving = False  # 画面只在文字或动画变化时改变
+
+    def __init__(self, stage, report):
+        self.stage = stage
+        self.report = report
+        self.frame = None
+
+    def begin(self, plan, count, shown, prev, blend_frames, transition, roi):
+        self.plan = plan
+        self.shown = shown
+        self.sprite_drawn = False
+        with self.report.stage("composite"):
+            self.frame = self.stage.stage(plan.speaker).copy()
+        with self.report.stage("text"):
+            stamp_glyphs(self.frame, plan.name_glyphs + plan.glyphs[:shown], self.stage.text_color)
+        if self.stage.lut is not None:
+            with self.report.stage("palette"):
+                self.stage.lut.apply_roi(self.frame, placements_rect(plan.name_glyphs + plan.glyphs[:shown]))
+        self.anim_roi = None
+        if plan.sheet is not None:
+            self.anim_roi = union_rect([plan.avatar_rect, plan.sheet_rect()], self.stage.width, self.stage.height)
+        self.prev_frame = prev[1] if prev is not None else None
+        return self.frame
+
+    def update(self, i, shown, sprite_index):
+        """推进到新的文字进度和动画帧（只在有变化时调用）"""
+        plan, frame = self.plan, self.frame
+        if shown > self.shown:
+            new = plan.glyphs[self.shown:shown]
+            with self.report.stage("text"):
+                stamp_glyphs(frame, new, self.stage.text_color)
+            if self.stage.lut is not None:
+                with self.report.stage("palette"):
+                    self.stage.lut.apply_roi(frame, placements_rect(new))
+            self.report.count("glyphs_stamped", shown - self.shown)
+            self.shown = shown
+        if self.anim_roi is not None and (sprite_index is not None or self.sprite_drawn):
+            # 动画结束后再重画一次，恢复静态立绘
+            with self.report.stage("animation"):
+                self.stage.redraw_speaker(frame, self.anim_roi, plan.speaker, plan.sprite(sprite_index),
+                                          plan.name_glyphs + plan.glyphs[:shown])
+            self.sprite_drawn = sprite_index is not None
+
+    def previous(self):
+        """过渡时混合的上一句画面"""
+        return self.prev_frame
+
+    def finish(self):
+        return self.frame  # 每句都是新拷贝，可直接作为下一句过渡的上一帧
+
+
+class CameraFrames:
+    """镜头运动：每帧从放大的背景取景，叠加缓存的前景层、动画帧和文字
+
+    淡入淡出时把上一句的前景画在当前取景的背景上再混合，背景不会停住；滑动推走上一句的最后一帧。
+    """
+    moving = True  # 背景每帧都在动
+
+    def __init__(self, stage, camera_path, camera_bg, interpolation, report):
+        self.stage = stage
+        self.path = camera_path
+        self.camera_bg = camera_bg
+        self.interpolation = interpolation
+        self.report = report
+        self.frame = np.empty((stage.height, stage.width, 3), dtype=np.uint8)
+        self.prev_buffer = np.empty_like(self.frame)  # 淡入淡出时上一句的画面
+
+    def begin(self, plan, count, shown, prev, blend_frames, transition, roi):
+        self.plan = plan
+        with self.report.stage("camera"):
+            self.matrices = self.path.segment(count)
+        self.report.count("camera_frames", count)
+        self.stage_layer, self.backdrop_layer = self.stage.foreground(plan.speaker)
+        # 上一句的前景层和字形每句只取一次
+        self.crossfade = blend_frames if transition == 'crossfade' else 0
+        self.roi = roi
+        self.prev_frame = prev[1] if prev is not None else None
+        if self.crossfade:
+            prev_plan = prev[0]
+            self.prev_layer = self.stage.foreground(prev_plan.speaker)[0]
+            self.prev_glyphs = prev_plan.name_glyphs + prev_plan.glyphs
+        # 背景取景后已在调色板内，只需量化前景覆盖的区域
+        self.quantize_roi = union_rect(
+            [layer[2] for layer in (self.stage_layer, self.backdrop_layer) if layer is not None] +
+            [plan.sheet_rect(), placements_rect(plan.name_glyphs + plan.glyphs)], self.stage.width, self.stage.height)
+        return self.frame
+
+    def update(self, i, shown, sprite_index):
+        """合成第 i 帧（每帧都调用）"""
+        plan, frame, stage = self.plan, self.frame, self.stage
+        with self.report.stage("camera"):
+            warp(self.camera_bg, self.matrices[i], frame, self.interpolation)
+        if i < self.crossfade:
+            with self.report.stage("transition"):
+                x0, y0, x1, y1 = self.roi
+                self.prev_buffer[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+                composite_layer(self.prev_buffer, self.prev_layer)
+                stamp_glyphs(self.prev_buffer, self.prev_glyphs, stage.text_color)
+                if stage.lut is not None:
+                    stage.lut.apply_roi(self.prev_buffer, self.roi)
+        with self.report.stage("composite"):
+            sprite = plan.sprite(sprite_index)
+            if sprite is not None:
+                composite_layer(frame, self.backdrop_layer)
+                overlay_image(frame, *sprite)
+                stage.shade_box(frame)
+            else:
+                composite_layer(frame, self.stage_layer)
+        with self.report.stage("text"):
+            stamp_glyphs(frame, plan.name_glyphs + plan.glyphs[:shown], stage.text_color)
+        if stage.lut is not None:
+            with self.report.stage("palette"):
+                stage.lut.apply_roi(frame, self.quantize_roi)
+
+    def previous(self):
+        return self.prev_buffer if self.crossfade else self.prev_frame
+
+    def finish(self):
+        return self.frame.copy()  # 帧缓冲下一句继续复用
+
+
+class LinePipeline:
+    """一句台词的逐帧流程：过渡、打字机、动画、量化、放大和编码，静态镜头和镜头运动共用
+
+    source 为 StaticFrames 或 CameraFrames；present_scale > 1 时最近邻整数倍放大后再编码。
+    """
+
+    def __init__(self, source, transitioner, out, report, layout, lut=None, transition='cut', transition_frames=0,
+                 typewriter=False, typewriter_cps=15, fps=30, present_scale=1):
+        self.source = source
+        self.transitioner = transitioner
+        self.out = out
+        self.report = report
+        self.layout = layout
+        self.lut = lut
+        self.transition = transition
+        self.transition_frames = transition_frames if transition != 'cut' else 0
+        self.typewriter = typewriter
+        self.typewriter_cps = typewriter_cps
+        self.fps = fps
+        self.present_scale = present_scale
+        if present_scale > 1:
+            self.upscaled = np.empty((layout.height * present_scale, layout.width * present_scale, 3), dtype=np.uint8)
+        self.prev = None  # (上一句的 LinePlan, 最后一帧)
+
+    def present(self, frame):
+        """最近邻整数倍放大到输出分辨率（复用同一缓冲）"""
+        if self.present_scale == 1:
+            return frame
+        cv2.resize(frame, (self.upscaled.shape[1], self.upscaled.shape[0]), dst=self.upscaled,
+                   interpolation=cv2.INTER_NEAREST)
+        return self.upscaled
+
+    def blend_frames(self, count):
+        """本句开头的过渡帧数（第一句没有过渡）"""
+        return min(self.transition_frames, count) if self.prev is not None else 0
+
+    def reveal_frames(self, plan, hold_seconds):
+        """打字机模式下本句至少需要的帧数：过渡、逐字显示完毕，再停留 hold_seconds"""
+        if not self.typewriter:
+            return 0
+        reveal = int(np.ceil((len(plan.glyphs) / self.typewriter_cps + hold_seconds) * self.fps))
+        return reveal + (self.transition_frames if self.prev is not None else 0)
+
+    def shown(self, held, total):
+        """停留段第 held 帧显示的字数"""
+        if not self.typewriter:
+            return total
+        return min(total, int(np.ceil((held + 1) * self.typewriter_cps / self.fps)))
+
+    def _write(self, frame, repeat=1):
+        with self.report.stage("encode"):
+            self.out.write(frame, repeat=repeat)
+
+    def render(self, plan, count):
+        """合成并写出一句台词的 count 帧，返回最后一帧"""
+        source = self.source
+        blend_frames = self.blend_frames(count)
+        roi = None
+        if blend_frames:
+            roi = union_rect([self.layout.dialog_box, self.prev[0].avatar_rect, plan.avatar_rect],
+                             self.layout.width, self.layout.height)
+            if roi is None:
+                blend_frames = 0
+        initial = (0 if self.typewriter else len(plan.glyphs), None)  # 过渡段：台词未开始显示，动画未开始
+        frame = source.begin(plan, count, initial[0], self.prev, blend_frames, self.transition, roi)
+
+        state = initial
+        output = None  # 放大后的当前帧，帧缓冲改写或放大缓冲被过渡帧占用后失效
+        refresh = True  # 帧缓冲改写后过渡缓冲需要重新拷贝整帧
+        repeat = 0
+        for i in range(count):
+            held = i - blend_frames  # 过渡结束后的帧号
+            target = initial if held < 0 else (self.shown(held, len(plan.glyphs)), plan.sprite_index(held))
+            if target != state or source.moving:
+                if repeat:
+                    self._write(output, repeat)  # 改写帧缓冲之前写出
+                    repeat = 0
+                source.update(i, *target)
+                state = target
+                output = None
+                refresh = True
+            if held < 0:
+                with self.report.stage("transition"):
+                    blended = self.transitioner.blend(self.transition, source.previous(), frame, roi,
+                                                      (i + 1) / (blend_frames + 1), refresh=refresh)
+                    if self.lut is not None and self.transition == 'crossfade':
+                        # 淡入淡出产生调色板外的混合色；滑动只移动已量化的像素
+                        self.lut.apply_roi(blended, roi)
+                refresh = False
+                with self.report.stage("upscale"):
+                    blended = self.present(blended)
+                self._write(blended)
+                output = None
+                continue
+            if output is None:
+                with self.report.stage("upscale"):
+                    output = self.present(frame)
+            repeat += 1
+        if repeat:
+            self._write(output, repeat)
+
+        self.prev = (plan, source.finish())
+        return self.prev[1]
@@ -0,0 +1,165 @@
+"""视频编码后端：cv2.VideoWriter、ffmpeg 原始帧管道、PNG 序列（调试用）"""
+import shutil
+import subprocess
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+class Encoder:
+    """编码器接口：write 写入 BGR uint8 帧，close 结束输出，abort 放弃输出"""
+    extension = '.mp4'
+
+    def __init__(self, path, size, fps, **options):
+        self.path = Path(path)
+        self.size = tuple(size)
+        self.fps = fps
+        self.options = options
+        self.frames = 0
+
+    def write(self, frame, repeat=1):
+        """写入一帧，repeat 为连续重复的次数（静止画面）"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """尽快结束，不保证写完已提交的帧；输出文件由调用方删除"""
+        try:
+            self.close()
+        except RuntimeError:
+            pass
+
+    def output_bytes(self):
+        """输出文件总大小"""
+        return self.path.stat().st_size if self.path.is_file() else 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CV2Encoder(Encoder):
+    """OpenCV VideoWriter（mp4v，无码率控制）"""
+
+    def __init__(self, path, size, fps, fourcc='mp4v', **options):
+        super().__init__(path, size, fps, **options)
+        self.writer = cv2.VideoWriter(str(self.path), cv2.VideoWriter_fourcc(*fourcc), fps, self.size)
+        if not self.writer.isOpened():
+            raise RuntimeError("视频写入器初始化失败")
+
+    def write(self, frame, repeat=1):
+        for _ in range(repeat):
+            self.writer.write(frame)
+        self.frames += repeat
+
+    def close(self):
+        if self.writer.isOpened():
+            self.writer.release()
+
+
+class FFmpegEncoder(Encoder):
+    """ffmpeg 子进程：原始 BGR 帧经 stdin 管道以 memoryview 零拷贝写入，x264 编码"""
+
+    def __init__(self, path, size, fps, preset='veryfast', crf=23, ffmpeg='ffmpeg', **options):
+        super().__init__(path, size, fps, **options)
+        binary = shutil.which(ffmpeg)
+        if binary is None:
+            raise RuntimeError("未找到 ffmpeg")
+        width, height = self.size
+        cmd = [
+            binary, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', 'pipe:0',
+            '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+            '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+            str(self.path),
+        ]
+        self.frame_bytes = width * height * 3
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame, repeat=1):
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        if frame.nbytes != self.frame_bytes:
+            raise ValueError(f"帧尺寸不匹配: {frame.shape}")
+        data = memoryview(frame).cast('B')
+        try:
+            for _ in range(repeat):
+                self.process.stdin.write(data)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg 异常退出: {self._stderr()}") from None
+        self.frames += repeat
+
+    def _stderr(self):
+        return self.process.stderr.read().decode(errors='replace').strip()
+
+    def close(self):
+        if self.process.poll() is not None and self.process.stdin.closed:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = self._stderr()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg 编码失败: {error}")
+
+    def abort(self):
+        """直接结束 ffmpeg，丢弃管道中尚未编码的帧"""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass  # 缓冲区中未写出的数据随进程一起丢弃
+
+
+class PNGSequenceEncoder(Encoder):
+    """逐帧写出 PNG 文件到目录，用于调试"""
+    extension = ''
+
+    def __init__(self, path, size, fps, compression=1, **options):
+        super().__init__(path, size, fps, **options)
+        self.path.mkdir(parents=True, exist_ok=True)
+        for old in self.path.glob('frame_*.png'):
+            old.unlink()
+        self.params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+
+    def write(self, frame, repeat=1):
+        for _ in range(repeat):
+            cv2.imwrite(str(self.path / f'frame_{self.frames:06d}.png'), frame, self.params)
+            self.frames += 1
+
+    def output_bytes(self):
+        return sum(f.stat().st_size for f in self.path.glob('frame_*.png'))
+
+
+ENCODERS = {
+    'cv2': CV2Encoder,
+    'ffmpeg': FFmpegEncoder,
+    'png': PNGSequenceEncoder,
+}
+DEFAULT_ENCODER = 'cv2'
+
+
+def available_encoders():
+    """当前环境可用的编码后端"""
+    return [name for name in ENCODERS if name != 'ffmpeg' or shutil.which('ffmpeg')]
+
+
+def create_encoder(name, path, size, fps, process=False, **options):
+    """按名称创建编码器，path 不含扩展名；process=True 时在独立进程中编码（见 shm_frames）"""
+    if name not in ENCODERS:
+        raise ValueError(f"未知的编码后端: {name}")
+    cls = ENCODERS[name]
+    if process:
+        from shm_frames import ProcessEncoder  # shm_frames 依赖本模块
+        return ProcessEncoder(f"{path}{cls.extension}", size, fps, backend=name, **options)
+    return cls(f"{path}{cls.extension}", size, fps, **options)
@@ -0,0 +1,88 @@
+"""字形图集：按 (字体, 字号) 缓存单字遮罩，直接在帧缓冲上逐字贴字
+
+打字机效果每帧只贴新出现的字，每帧开销与新字数成正比，而不是与整帧大小成正比。
+"""
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+NOTDEF_PROBE = '\U0010fffd'  # 私用区字符，字体中都没有，用来取得 .notdef（缺字方框）的字形
+
+
+class GlyphAtlas:
+    def __init__(self, font_path, size, antialias=True):
+        self.font = ImageFont.truetype(font_path, size)
+        self.antialias = antialias
+        self.glyphs = {}  # 字符 -> (遮罩, x偏移, y偏移, 步进)
+
+    def glyph(self, char):
+        """取字符遮罩，首次使用时渲染"""
+        cached = self.glyphs.get(char)
+        if cached is None:
+            advance = self.font.getlength(char)
+            x0, y0, x1, y1 = self.font.getbbox(char)
+            if x1 > x0 and y1 > y0:
+                image = Image.new('L', (x1 - x0, y1 - y0), 0)
+                draw = ImageDraw.Draw(image)
+                if not self.antialias:
+                    draw.fontmode = '1'  # 像素风格：不做抗锯齿
+                draw.text((-x0, -y0), char, font=self.font, fill=255)
+                mask = np.asarray(image, dtype=np.uint16)[:, :, None]
+            else:
+                mask = None  # 空白字符只有步进
+            cached = (mask, x0, y0, advance)
+            self.glyphs[char] = cached
+        return cached
+
+    def _bitmap(self, char):
+        mask = self.font.getmask(char)
+        return mask.size, bytes(mask)
+
+    def missing(self, text):
+        """字体中没有、会画成 .notdef 方框的字符（去重，保持出现顺序）"""
+        notdef = self._bitmap(NOTDEF_PROBE)
+        return [char for char in dict.fromkeys(text) if not char.isspace() and self._bitmap(char) == notdef]
+
+    def layout(self, text, x, y):
+        """计算每个字的 (遮罩, 左上角x, 左上角y)，空白字符遮罩为 None"""
+        placements = []
+        pen = float(x)
+        for char in text:
+            mask, dx, dy, advance = self.glyph(char)
+            placements.append((mask, int(round(pen)) + dx, y + dy))
+            pen += advance
+        return placements
+
+
+@lru_cache(maxsize=32)
+def get_atlas(font_path, size, antialias=True):
+    """共享的字形图集"""
+    return GlyphAtlas(font_path, size, antialias)
+
+
+def stamp_glyphs(frame, placements, color):
+    """把字形按遮罩混合到 BGR 帧上，超出画面的部分裁剪"""
+    height, width = frame.shape[:2]
+    color = np.array(color, dtype=np.uint16)
+    for mask, x, y in placements:
+        if mask is None:
+            continue
+        h, w = mask.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, width), min(y + h, height)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        m = mask[y0 - y:y1 - y, x0 - x:x1 - x]
+        dst = frame[y0:y1, x0:x1]
+        dst[:] = (dst * (255 - m) + color * m + 127) // 255
+
+
+def placements_rect(placements):
+    """字形的外接矩形 (x0, y0, x1, y1)，没有可见字形时返回 None"""
+    rects = [(x, y, x + mask.shape[1], y + mask.shape[0]) for mask, x, y in placements if mask is not None]
+    if not rects:
+        return None
+    return (min(r[0] for r in rects), min(r[1] for r in rects),
+            max(r[2] for r in rects), max(r[3] for r in rects))
+
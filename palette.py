@@ -0,0 +1,78 @@
+"""调色板量化：把画面颜色归并到固定调色板，得到统一的复古色彩
+
+逐像素搜索最近颜色太慢，这里预先计算 32x32x32 的三维查找表（每个颜色通道取高 5 位），
+量化时只需一次向量化的 NumPy 索引。
+"""
+from functools import lru_cache
+
+import numpy as np
+
+LUT_BITS = 5  # 每个通道保留的位数，查找表共 (2^LUT_BITS)^3 个格子
+
+# 调色板名称 -> (显示名称, RGB 十六进制颜色)
+PALETTES = {
+    'pico8': ('PICO-8（16色）', [
+        '000000', '1d2b53', '7e2553', '008751', 'ab5236', '5f574f', 'c2c3c7', 'fff1e8',
+        'ff004d', 'ffa300', 'ffec27', '00e436', '29adff', '83769c', 'ff77a8', 'ffccaa',
+    ]),
+    'db32': ('DawnBringer（32色）', [
+        '000000', '222034', '45283c', '663931', '8f563b', 'df7126', 'd9a066', 'eec39a',
+        'fbf236', '99e550', '6abe30', '37946e', '4b692f', '524b24', '323c39', '3f3f74',
+        '306082', '5b6ee1', '639bff', '5fcde4', 'cbdbfc', 'ffffff', '9badb7', '847e87',
+        '696a6a', '595652', '76428a', 'ac3232', 'd95763', 'd77bba', '8f974a', '8a6f30',
+    ]),
+    'gameboy': ('Game Boy（4色）', ['0f380f', '306230', '8bac0f', '9bbc0f']),
+}
+
+
+class PaletteLUT:
+    """BGR 图像到调色板颜色的查找表"""
+
+    def __init__(self, colors):
+        rgb = np.array([[int(c[i:i + 2], 16) for i in (0, 2, 4)] for c in colors], dtype=np.int32)
+        self.colors = np.ascontiguousarray(rgb[:, ::-1]).astype(np.uint8)  # BGR
+
+        # 每个格子取中心颜色，找最近的调色板颜色
+        bins = 1 << LUT_BITS
+        step = 256 // bins
+        centers = np.arange(bins) * step + step // 2
+        b, g, r = np.meshgrid(centers, centers, centers, indexing='ij')
+        grid = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=1)
+        dist = ((grid[:, None, :] - self.colors[None, :, :].astype(np.int32)) ** 2).sum(axis=2)
+        self.table = self.colors[dist.argmin(axis=1)]
+
+        # 调色板颜色所在格子固定映射到自身，已量化的像素再次量化时保持不变
+        self.table[self.index(self.colors)] = self.colors
+
+    @staticmethod
+    def index(image):
+        """BGR 像素在查找表中的下标"""
+        shift = 8 - LUT_BITS
+        idx = (image[..., 0] >> shift).astype(np.intp) << (2 * LUT_BITS)
+        idx |= (image[..., 1] >> shift).astype(np.intp) << LUT_BITS
+        idx |= image[..., 2] >> shift
+        return idx
+
+    def apply(self, image, out=None):
+        """量化 BGR 图像；out 可以是 image 本身（原地量化）"""
+        quantized = self.table[self.index(image)]
+        if out is None:
+            return quantized
+        out[...] = quantized
+        return out
+
+    def apply_roi(self, frame, rect):
+        """原地量化帧中的 (x0, y0, x1, y1) 区域（超出画面部分裁剪）"""
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        roi = frame[max(y0, 0):y1, max(x0, 0):x1]
+        self.apply(roi, out=roi)
+
+
+@lru_cache(maxsize=None)
+def get_lut(name):
+    """调色板对应的查找表（首次使用时计算）"""
+    if name not in PALETTES:
+        raise ValueError(f"未知的调色板: {name}")
+    return PaletteLUT(PALETTES[name][1])
@@ -0,0 +1,116 @@
+"""场景编辑器录屏：主循环只把窗口画面拷进预分配的缓冲区，编码在后台线程完成
+
+缓冲区数量固定（即有界队列）；编码跟不上时直接丢弃新帧并计数，主循环不会被阻塞。
+32 位窗口直接映射 Surface 的像素内存（零拷贝），用 cv2 一次转换成 BGR 写入缓冲区；
+其他像素格式退回 pygame.surfarray 视图。
+"""
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+import pygame
+
+from encoders import create_encoder, DEFAULT_ENCODER
+
+RECORD_FPS = 30
+RECORD_QUEUE_SIZE = 8  # 等待编码的最大帧数
+
+
+def copy_surface(surface, out):
+    """把 Surface 画面拷贝为 (高, 宽, 3) BGR"""
+    width, height = surface.get_size()
+    codes = {(0, 8, 16): cv2.COLOR_RGBA2BGR, (16, 8, 0): cv2.COLOR_BGRA2BGR}
+    code = codes.get(surface.get_shifts()[:3])
+    if surface.get_bytesize() == 4 and code is not None and sys.byteorder == 'little':
+        # 小端序下字节顺序由各通道的位移决定；按行跨度映射像素内存，不做额外拷贝
+        raw = np.frombuffer(surface.get_buffer(), dtype=np.uint8)
+        pixels = raw.reshape(height, surface.get_pitch())[:, :width * 4].reshape(height, width, 4)
+        cv2.cvtColor(pixels, code, dst=out)
+        return out
+    view = pygame.surfarray.pixels3d(surface) if surface.get_bytesize() in (3, 4) else pygame.surfarray.array3d(surface)
+    np.copyto(out, view.transpose(1, 0, 2)[:, :, ::-1])
+    del view  # 释放对 Surface 的锁定
+    return out
+
+
+class FrameRecorder:
+    """把 pygame 窗口按固定帧率录制为视频"""
+
+    def __init__(self, path, size, fps=RECORD_FPS, encoder=DEFAULT_ENCODER, queue_size=RECORD_QUEUE_SIZE,
+                 **encoder_options):
+        width, height = size
+        self.size = (width, height)
+        self.fps = fps
+        self.encoder = create_encoder(encoder, path, self.size, fps, **encoder_options)
+        self.path = self.encoder.path
+
+        # 空闲缓冲区池：主循环取缓冲区写入画面，编码线程写完后归还
+        self._free = queue.Queue()
+        for _ in range(queue_size):
+            self._free.put(np.empty((height, width, 3), dtype=np.uint8))
+        self._pending = queue.Queue()  # (缓冲区, 重复次数)；None 表示结束
+
+        self.captured = 0  # 写入视频的帧数（含重复帧）
+        self.dropped = 0  # 因编码跟不上而丢弃的帧数
+        self.error = None
+        self._next_frame = None
+        self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._thread.start()
+
+    def _encode_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            buffer, repeat = item
+            try:
+                if self.error is None:
+                    for _ in range(repeat):
+                        self.encoder.write(buffer)
+            except Exception as e:
+                self.error = e  # 编码失败后继续消费队列，避免主循环拿不到缓冲区
+            finally:
+                self._free.put(buffer)
+
+    def capture(self, surface, now_ms=None):
+        """按录制帧率采样窗口画面；主循环变慢时用重复帧补齐时长。返回是否采样了这一帧"""
+        now_ms = pygame.time.get_ticks() if now_ms is None else now_ms
+        interval = 1000.0 / self.fps
+        if self._next_frame is None:
+            self._next_frame = now_ms
+        if now_ms < self._next_frame:
+            return False
+        repeat = int((now_ms - self._next_frame) // interval) + 1
+        self._next_frame += repeat * interval
+
+        try:
+            buffer = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += repeat
+            return False
+
+        copy_surface(surface, buffer)
+
+        self.captured += repeat
+        self._pending.put((buffer, repeat))
+        return True
+
+    def stop(self):
+        """等待剩余帧编码完成，返回统计信息"""
+        started = time.perf_counter()
+        self._pending.put(None)
+        self._thread.join()
+        try:
+            self.encoder.close()
+        except RuntimeError as e:
+            self.error = self.error or e
+        return {
+            "path": str(self.path),
+            "frames": self.captured,
+            "dropped": self.dropped,
+            "flush_seconds": time.perf_counter() - started,
+            "error": str(self.error) if self.error else None,
+        }
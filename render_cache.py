@@ -0,0 +1,220 @@
+"""渲染结果缓存：相同的脚本、角色配置、资源和渲染选项直接返回已生成的视频
+
+缓存键是规范化输入（去掉行号、统一数字格式、资源按内容哈希）的 SHA-256，包含渲染器版本，
+渲染逻辑改变时递增版本即可让旧结果失效。缓存总大小超过配额时按最近使用时间淘汰。
+命中/未命中/淘汰次数持久化在缓存目录的索引中。
+
+查找只更新内存中的记录，索引只在写入和淘汰时落盘；多个进程共用缓存目录时，
+落盘前在锁文件保护下重新读取磁盘上的索引并合并，不会覆盖其他进程写入的条目。
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+RENDER_CACHE_DIR = Path("movies") / "cache"
+RENDER_CACHE_QUOTA = 2 * 1024 ** 3  # 缓存总大小上限（字节）
+INDEX_VERSION = 1
+LOCK_STALE_SECONDS = 30  # 锁文件超过这个时间未释放视为持锁进程已退出
+
+
+def _normalize(value):
+    """规范化输入：数字统一为浮点数，元组转列表
+
+    字符串原样保留：台词和角色名中的空白会改变渲染出的画面，必须逐字参与哈希；
+    资源路径已按内容哈希，枚举选项在渲染前按名称精确校验，都不需要再处理。
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 6)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if hasattr(value, 'item'):  # NumPy 标量（来自 DataFrame）
+        return _normalize(value.item())
+    return str(value)
+
+
+def render_key(inputs):
+    """规范化输入的 SHA-256 缓存键"""
+    canonical = json.dumps(_normalize(inputs), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+_digests = {}
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """跨进程互斥：以独占方式创建锁文件，退出时删除"""
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(path).st_mtime > LOCK_STALE_SECONDS:
+                    os.unlink(path)
+                    continue
+            except OSError:
+                continue  # 锁刚被释放
+            time.sleep(0.05)
+    os.close(fd)
+    try:
+        yield
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def file_digest(path):
+    """文件内容哈希，按 (路径, 大小, 修改时间) 在进程内缓存；文件不存在返回 None"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+class RenderCache:
+    def __init__(self, root=RENDER_CACHE_DIR, quota=RENDER_CACHE_QUOTA):
+        self.root = Path(root)
+        self.quota = quota
+        self.index_file = self.root / "index.json"
+        self.lock_file = self.root / "index.lock"
+        self.entries = {}  # 缓存键 -> {file, size, frames, lines, created, last_used}
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._pending = dict.fromkeys(self.counters, 0)  # 上次落盘后本进程新增的计数
+        self._removed = set()  # 上次落盘后本进程发现文件已丢失的缓存键
+        self._lock = threading.Lock()
+        self.entries, self.counters = self._read()
+
+    def _read(self):
+        """磁盘上的 (条目, 计数)，索引不存在或版本不符时为空"""
+        entries, counters = {}, dict.fromkeys(self.counters, 0)
+        try:
+            data = json.loads(self.index_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return entries, counters
+        if data.get('version') == INDEX_VERSION:
+            entries = data.get('entries', {})
+            counters.update(data.get('counters', {}))
+        return entries, counters
+
+    def _merge(self):
+        """把磁盘上的索引（可能已被其他进程更新）与本进程的记录合并，需持有索引锁"""
+        entries, counters = self._read()
+        for key, entry in self.entries.items():
+            if key in entries:
+                entries[key]['last_used'] = max(entries[key]['last_used'], entry['last_used'])
+            elif (self.root / entry['file']).is_file():
+                entries[key] = entry  # 其他进程淘汰的条目文件已删除，不再加回
+        for key in self._removed:
+            entries.pop(key, None)
+        for name, count in self._pending.items():
+            counters[name] = counters.get(name, 0) + count
+        self.entries, self.counters = entries, counters
+        self._pending = dict.fromkeys(self._pending, 0)
+        self._removed.clear()
+
+    def _save(self):
+        """原子写入索引，需持有索引锁"""
+        try:
+            tmp = self.index_file.with_name(f"index.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({'version': INDEX_VERSION, 'entries': self.entries,
+                                       'counters': self.counters}), encoding='utf-8')
+            os.replace(tmp, self.index_file)
+        except OSError:
+            pass  # 索引写入失败只影响统计和淘汰顺序
+
+    def _count(self, name):
+        self.counters[name] += 1
+        self._pending[name] += 1
+
+    def get(self, key):
+        """查找缓存，命中返回条目（含 path），否则返回 None；只更新内存，下次写入时落盘"""
+        with self._lock:
+            entry = self.entries.get(key)
+            path = self.root / entry['file'] if entry else None
+            if path is None or not path.is_file():
+                if entry:
+                    del self.entries[key]  # 文件已被手动删除或被其他进程淘汰
+                    self._removed.add(key)
+                self._count('misses')
+                return None
+            entry['last_used'] = time.time()
+            self._count('hits')
+            return dict(entry, path=str(path))
+
+    def put(self, key, video_path, **meta):
+        """把渲染结果复制进缓存（输出文件会被下次渲染覆盖，不能用硬链接），返回缓存路径"""
+        video_path = Path(video_path)
+        if not video_path.is_file():
+            return None
+        size = video_path.stat().st_size
+        if size > self.quota:
+            return None
+        name = f"{key[:32]}{video_path.suffix}"
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.root / f"{name}.{os.getpid()}.tmp"
+            shutil.copyfile(video_path, tmp)
+            with _file_lock(self.lock_file):
+                os.replace(tmp, self.root / name)
+                self._merge()
+                now = time.time()
+                self.entries[key] = dict(meta, file=name, size=size, created=now, last_used=now)
+                self._evict()
+                self._save()
+        return self.root / name
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到总大小不超过配额"""
+        total = sum(entry['size'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_used']):
+            if total <= self.quota:
+                break
+            entry = self.entries.pop(key)
+            (self.root / entry['file']).unlink(missing_ok=True)
+            total -= entry['size']
+            self.counters['evictions'] += 1
+
+    def stats(self):
+        """命中率和占用情况"""
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': self.counters['hits'] / lookups if lookups else None,
+                'entries': len(self.entries),
+                'bytes': sum(entry['size'] for entry in self.entries.values()),
+                'quota': self.quota,
+            }
+
+
+_cache = None
+
+
+def get_render_cache():
+    """进程内共享的渲染结果缓存"""
+    global _cache
+    if _cache is None:
+        _cache = RenderCache()
+    return _cache
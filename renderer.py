@@ -0,0 +1,499 @@
+"""视频渲染：按渲染配置（分辨率/帧率）合成背景、立绘和对话框"""
+import re
+import shutil
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import asset_store
+from compositor import CameraFrames, LinePipeline, LinePlan, Stage, StaticFrames
+from glyph_atlas import get_atlas
+from palette import get_lut, PALETTES
+from audio_mixer import AudioMixer, clip_duration, ffmpeg_available, mux_audio, MUSIC_ROOT
+from encoders import create_encoder, DEFAULT_ENCODER
+from telemetry import RenderReport
+from transitions import TransitionRenderer, TRANSITIONS, DEFAULT_TRANSITION
+from scene_file import Scene, SCENES_DIR, find_character
+from asset_index import get_index
+from render_cache import get_render_cache, render_key, file_digest
+from camera import CameraPath, CAMERA_MOTIONS, DEFAULT_CAMERA, oversize
+
+FONT_PATH = 'assets/fonts/AlibabaPuHuiTi-3-55-Regular.ttf'
+FONT_COLOR = (255, 255, 255)
+LINE_SECONDS = 2  # 每句台词持续时间
+PROGRESS_INTERVAL = 0.5  # 进度产出间隔（秒）
+PREVIEW_WIDTH = 320  # 预览缩略图宽度
+TRANSITION_SECONDS = 0.3  # 过渡效果时长
+TYPEWRITER_CPS = 15  # 打字机效果每秒出现的字数
+TYPEWRITER_HOLD = 1.0  # 打字机效果全部显示后台词至少停留的时间（秒）
+VOICE_PADDING = 0.4  # 配音结束后台词额外停留的时间（秒）
+
+# 台词中的动作标记 -> 说话角色播放的动画（见 animation.ANIMATIONS）
+ACTION_TAGS = {'laugh': 'smile', 'nod': 'nod'}
+ACTION_PATTERN = re.compile(r'\[(\w+)\]')
+RENDERER_VERSION = 4  # 渲染输出改变时递增，使渲染结果缓存失效
+DEFAULT_HEAD_SIZE = 70  # 场景编辑器中的默认头部大小
+MIN_FONT_SIZE = 12  # 合成分辨率下字号的下限，低分辨率（像素风、草稿）的文字仍然可读
+
+# 渲染配置：draft 用于在正式渲染前快速检查节奏
+# pixel_scale 表示以 size / pixel_scale 的原生像素分辨率合成，编码前最近邻整数倍放大
+RENDER_PROFILES = {
+    'full': {'label': '高清 1280x720 30fps', 'size': (1280, 720), 'fps': 30, 'suffix': ''},
+    'fhd': {'label': '全高清 1920x1080 30fps', 'size': (1920, 1080), 'fps': 30, 'suffix': '_fhd'},
+    'pixel': {'label': '像素风 320x180 放大4倍至 1280x720 30fps', 'size': (1280, 720), 'fps': 30,
+              'suffix': '_pixel', 'pixel_scale': 4},
+    'draft': {'label': '草稿预览 320x180 10fps', 'size': (320, 180), 'fps': 10, 'suffix': '_draft'},
+}
+DEFAULT_PROFILE = 'full'
+
+
+class Layout:
+    """与分辨率无关的布局，以 1280x720 下的设计值按比例换算
+
+    字号不低于 MIN_FONT_SIZE；字号被抬高时对话框向上扩展，文字仍留在框内。
+    """
+
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+
+        def sx(v):
+            return int(round(v * width / 1280))
+
+        def sy(v):
+            return int(round(v * height / 720))
+
+        self.name_font_size = max(sy(36), MIN_FONT_SIZE)
+        self.text_font_size = max(sy(32), MIN_FONT_SIZE)
+        # 自下而上排列：台词、名字、对话框上沿，间距不小于对应字号所需
+        box_bottom = height - sy(50)
+        text_y = box_bottom - max(sy(30), round(self.text_font_size * 0.9))
+        name_y = text_y - max(sy(40), round(self.name_font_size * 1.1))
+        box_top = name_y - max(sy(30), self.name_font_size // 2)
+        self.dialog_box = (sx(50), box_top, width - sx(50), box_bottom)
+        self.name_pos = (sx(70), name_y)
+        self.text_pos = (sx(70), text_y)
+        self.avatar_x = sx(50)
+
+
+def stage_cast(cast, layout, scene=None):
+    """计算出场角色的站位，返回 {角色: (立绘, x, y)}
+
+    cast 为 {角色: (立绘, 场景站位)}。场景中有站位的角色按场景坐标水平居中，
+    其余角色从左边距到右边距均匀排开；只有一名角色时与原先一样靠左。
+    """
+    width, height = layout.width, layout.height
+    placements = {}
+    unplaced = []
+    for char_name, (avatar, entry) in cast.items():
+        if entry:
+            # 场景坐标按画布比例换算，立绘水平居中于角色位置、底部贴齐画面
+            x = int(entry["pos"][0] * width / scene.size[0]) - avatar.shape[1] // 2
+            placements[char_name] = (avatar, x, height - avatar.shape[0])
+        else:
+            unplaced.append(char_name)
+
+    margin = layout.avatar_x
+    for i, char_name in enumerate(unplaced):
+        avatar = cast[char_name][0]
+        if len(unplaced) == 1:
+            x = margin
+        else:
+            x = margin + int(i * (width - 2 * margin - avatar.shape[1]) / (len(unplaced) - 1))
+        placements[char_name] = (avatar, x, height - avatar.shape[0])
+    return placements
+
+
+def parse_action(text):
+    """去掉台词中的动作标记，返回 (显示文本, 动画名或 None)；多个标记时取第一个"""
+    actions = []
+
+    def strip(match):
+        tag = match.group(1).lower()
+        if tag not in ACTION_TAGS:
+            return match.group(0)
+        actions.append(ACTION_TAGS[tag])
+        return ''
+
+    text = ACTION_PATTERN.sub(strip, text)
+    return ' '.join(text.split()) if actions else text, actions[0] if actions else None
+
+
+def resolve_avatar(scene, char_name, avatar_file):
+    """角色实际使用的立绘文件和场景条目：场景中有该角色时用场景里的立绘资源"""
+    entry = find_character(scene, char_name, avatar_file) if scene else None
+    if entry:
+        avatar_file = scene.asset_file(entry["asset"])
+    return avatar_file, entry
+
+
+def cache_inputs(data, configs, background, scene_name, scene, profile, encoder, encoder_options, transition,
+                 transition_seconds, typewriter, typewriter_cps, show_cast, palette, voice_clips, music, music_volume,
+                 camera):
+    """渲染结果缓存键的输入：台词去掉行号，资源、场景、字体和配音都按内容哈希
+
+    background 为场景解析后的背景；立绘按 scene 解析出每个角色实际使用的文件再哈希。
+    """
+    lines = []
+    for i, line in enumerate(data):
+        if len(line) >= 3 and str(line[1]).strip():
+            clip = voice_clips[i] if voice_clips and i < len(voice_clips) else None
+            lines.append([line[1], line[2], file_digest(clip) if clip else None])
+    cast = {config[0]: resolve_avatar(scene, config[0], config[4])[0]
+            for config in configs if len(config) > 4 and config[4]}
+    index = get_index()
+    return {
+        "renderer": RENDERER_VERSION,
+        "lines": lines,
+        "configs": sorted([list(config[:5]) for config in configs], key=str),
+        "background": index.content_hash("background", background),
+        "avatars": {name: [avatar_file, index.content_hash("avatar", avatar_file)]
+                    for name, avatar_file in sorted(cast.items())},
+        "scene": file_digest(SCENES_DIR / scene_name) if scene_name else None,
+        "music": index.content_hash("music", music) if music else None,
+        "font": file_digest(FONT_PATH),
+        "options": {
+            # 是否在独立进程中编码不影响输出
+            "profile": RENDER_PROFILES[profile], "encoder": encoder,
+            "encoder_options": {k: v for k, v in (encoder_options or {}).items() if k != 'process'},
+            "transition": transition, "transition_seconds": transition_seconds, "typewriter": typewriter,
+            "typewriter_cps": typewriter_cps, "show_cast": show_cast, "palette": palette,
+            "music_volume": music_volume, "camera": camera,
+        },
+    }
+
+
+def _progress(status, message, **extra):
+    """渲染进度/结果信息"""
+    return dict(status=status, message=message, **extra)
+
+
+def _result(report, status, message, log_path=None, exc=None, **extra):
+    """结束报告并生成最终结果，可选追加到 JSONL 日志"""
+    report.finish(status, message, exc)
+    if log_path:
+        try:
+            report.append_jsonl(log_path)
+        except OSError:
+            pass  # 日志写入失败不影响渲染结果
+    return _progress(status, message, report=report.to_dict(), **extra)
+
+
+def _thumbnail(frame):
+    """生成 RGB 预览缩略图"""
+    scale = PREVIEW_WIDTH / frame.shape[1]
+    small = cv2.resize(frame, (PREVIEW_WIDTH, max(int(frame.shape[0] * scale), 1)), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+
+def _remove_output(path):
+    """删除未完成的输出（视频文件或 PNG 序列目录）"""
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def render_video(data, configs, background, scene_name=None, profile=DEFAULT_PROFILE, cancel_event=None,
+                 encoder=DEFAULT_ENCODER, encoder_options=None, output_path=None, report_log=None,
+                 trace_memory=False, transition=DEFAULT_TRANSITION, transition_seconds=TRANSITION_SECONDS,
+                 typewriter=False, typewriter_cps=TYPEWRITER_CPS, show_cast=True, palette=None,
+                 voice_clips=None, music=None, music_volume=1.0, use_cache=True, camera=DEFAULT_CAMERA):
+    """按渲染配置生成视频的生成器
+
+    渲染过程中定期产出进度（已完成台词数、帧率、剩余时间、预览缩略图），
+    最后产出 status 为 done/cancelled/error 的结果，附带结构化渲染报告（report）。
+    cancel_event 被设置时在两句台词之间停止。
+    encoder 为编码后端名称（见 encoders.ENCODERS），encoder_options 传给后端（如 preset/crf），
+    其中 process=True 时在独立进程中编码，帧经共享内存帧环传递（见 shm_frames）。
+    output_path 为不含扩展名的输出路径，默认 movies/scene{配置后缀}。
+    report_log 为 JSONL 日志路径，每次渲染结束追加一行报告；trace_memory 开启 tracemalloc 统计。
+    transition 为台词切换效果（见 transitions.TRANSITIONS），过渡帧占用后一句开头的 transition_seconds。
+    typewriter 开启后台词以每秒 typewriter_cps 个字逐字出现（在过渡结束后开始），台词时长延长到全部显示后
+    再停留 TYPEWRITER_HOLD 秒。
+    show_cast 为 True 时所有出场角色同时在场，非说话角色变暗；否则只显示说话角色。
+    台词中的动作标记（见 ACTION_TAGS，如 [laugh]）让说话角色播放预先烘焙的动画（sprite_baker）。
+    palette 为调色板名称（见 palette.PALETTES）：静态的舞台画面合成后量化一次并缓存，
+    之后每帧只量化文字和过渡等变化的区域。
+    voice_clips 为与 data 逐行对应的配音文件路径（可为 None），台词时长随配音延长；
+    music 为 assets/music 下的背景音乐文件名。有配音或音乐时，视频写完后流式混音并封装音轨，
+    配音音量取角色配置的「音量」列。
+    use_cache 为 True 时相同输入（见 cache_inputs）直接返回 render_cache 中的视频，渲染完成后写入缓存。
+    camera 为镜头运动（见 camera.CAMERA_MOTIONS）：不是 none 时每帧从放大的背景取景，
+    再叠加缓存的前景层和文字。
+    """
+    report = RenderReport(trace_memory=trace_memory, profile=profile, encoder=encoder,
+                          lines_total=len(data) if data else 0)
+
+    if not data:
+        yield _result(report, "error", "没有台词数据", report_log)
+        return
+    if profile not in RENDER_PROFILES:
+        yield _result(report, "error", f"未知的渲染配置: {profile}", report_log)
+        return
+    if transition not in TRANSITIONS:
+        yield _result(report, "error", f"未知的过渡效果: {transition}", report_log)
+        return
+    if palette and palette not in PALETTES:
+        yield _result(report, "error", f"未知的调色板: {palette}", report_log)
+        return
+    if camera not in CAMERA_MOTIONS:
+        yield _result(report, "error", f"未知的镜头运动: {camera}", report_log)
+        return
+    if (music or any(voice_clips or [])) and not ffmpeg_available():
+        yield _result(report, "error",
+                      "配音和背景音乐需要 ffmpeg：未找到 ffmpeg，请安装并加入 PATH，或关闭配音和背景音乐", report_log)
+        return
+    settings = RENDER_PROFILES[profile]
+
+    # 场景文件提供背景和角色站位
+    scene = None
+    if scene_name:
+        try:
+            scene = Scene.load(SCENES_DIR / scene_name)
+        except (OSError, ValueError) as e:
+            yield _result(report, "error", f"场景文件加载失败: {e}", report_log, e)
+            return
+        if scene.background_file():
+            background = scene.background_file()
+
+    if not background:
+        yield _result(report, "error", "请选择背景图片", report_log)
+        return
+
+    # 合成在内部分辨率下进行，像素风配置在编码前整数倍放大到输出分辨率
+    out_width, out_height = settings['size']
+    pixel_scale = settings.get('pixel_scale', 1)
+    width, height = out_width // pixel_scale, out_height // pixel_scale
+    fps = settings['fps']
+    layout = Layout(width, height)
+    report.info.update(size=[out_width, out_height], render_size=[width, height], fps=fps, background=background,
+                       transition=transition, typewriter=typewriter, palette=palette, camera=camera,
+                       encode_process=bool((encoder_options or {}).get('process')))
+    text_color = FONT_COLOR[::-1]  # RGB -> BGR
+
+    bg_path = f'assets/background/{background}'
+
+    # 字体缺失或缺字时直接报错，而不是把角色名和台词画成方框
+    try:
+        missing = get_atlas(FONT_PATH, layout.text_font_size).missing(
+            ''.join(str(line[1]) + parse_action(str(line[2]))[0] for line in data if len(line) >= 3))
+    except OSError as e:
+        yield _result(report, "error", f"字体加载失败: {FONT_PATH}（{e}）", report_log, e)
+        return
+    if missing:
+        yield _result(report, "error", f"字体 {FONT_PATH} 缺少字符: {''.join(missing[:20])}，"
+                                       f"请放入阿里巴巴普惠体（AlibabaPuHuiTi-3-55-Regular.ttf）", report_log)
+        return
+
+    # 相同输入直接返回缓存的视频（PNG 序列输出为目录，不缓存）
+    cache = get_render_cache() if use_cache and encoder != 'png' else None
+    cache_key = None
+    if cache is not None:
+        cache_key = render_key(cache_inputs(data, configs, background, scene_name, scene, profile, encoder,
+                                            encoder_options, transition, transition_seconds, typewriter,
+                                            typewriter_cps, show_cast, palette, voice_clips, music, music_volume,
+                                            camera))
+        cached = cache.get(cache_key)
+        report.cache("render", cached is not None)
+        report.info.update(render_cache_key=cache_key[:16])
+        if cached is not None:
+            report.info.update(render_cache=cache.stats(), output_bytes=cached['size'])
+            yield _result(report, "done", f"视频已生成（缓存）: {cached['path']}（{settings['label']}）", report_log,
+                          video_path=cached['path'], lines_done=cached.get('lines'), lines_total=cached.get('lines'),
+                          frames=cached.get('frames'), cached=True)
+            return
+
+    output_path = Path(output_path or f"movies/scene{settings['suffix']}")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        out = create_encoder(encoder, output_path, (out_width, out_height), fps,
+                             **(encoder_options or {}))
+    except (RuntimeError, ValueError) as e:
+        yield _result(report, "error", f"视频写入器初始化失败: {e}", report_log, e)
+        return
+    video_path = str(out.path)
+    completed = False  # 输出已正常关闭；否则退出时中止编码器并删除未完成的输出
+
+    try:
+        with report.stage("asset_load"):
+            # 预缩放的原始像素，内存映射只读访问，省去 JPEG 解码和缩放
+            report.cache("raw_asset", asset_store.is_prepared("background", background, (width, height)))
+            bg = asset_store.load_background(background, (width, height))
+            if bg is None:
+                yield _result(report, "error", f"背景图片加载失败: {bg_path}", report_log)
+                return
+
+            # 像素风不做文字抗锯齿，放大后保持清晰的像素边缘
+            name_atlas = get_atlas(FONT_PATH, layout.name_font_size, antialias=pixel_scale == 1)
+            text_atlas = get_atlas(FONT_PATH, layout.text_font_size, antialias=pixel_scale == 1)
+            lut = get_lut(palette) if palette else None
+
+            # 镜头运动：放大的背景常驻内存（调色板量化一次），取景用最近邻保持调色板颜色
+            if camera != 'none':
+                camera_bg = asset_store.load_background(background, oversize((width, height)))
+                if camera_bg is None:
+                    yield _result(report, "error", f"背景图片加载失败: {bg_path}", report_log)
+                    return
+                camera_bg = np.array(camera_bg)
+                if lut is not None:
+                    lut.apply(camera_bg, out=camera_bg)
+
+        # 角色立绘配置
+        avatar_files = {config[0]: config[4] for config in configs if config[4]}
+        cast_files = {}  # 角色 -> 实际使用的立绘文件（场景中的资源优先）
+
+        def load_avatar(char_name):
+            """返回 (立绘, 场景站位)，没有立绘时返回 None"""
+            avatar_file = avatar_files.get(char_name)
+            if not avatar_file:
+                return None
+            avatar_file, entry = resolve_avatar(scene, char_name, avatar_file)
+            # 预缩放的原始像素，内存映射只读访问
+            report.cache("raw_asset", asset_store.is_prepared("avatar", avatar_file, (width, height)))
+            avatar = asset_store.load_avatar(avatar_file, (width, height))
+            if avatar is None:
+                return None
+            cast_files[char_name] = avatar_file
+
+            head_size = entry.get("head_size", DEFAULT_HEAD_SIZE) if entry else DEFAULT_HEAD_SIZE
+            if head_size != DEFAULT_HEAD_SIZE:
+                # 按场景中的头部大小缩放
+                avatar_height = min(height, int(avatar.shape[0] * head_size / DEFAULT_HEAD_SIZE))
+                avatar_width = int(avatar_height * avatar.shape[1] / avatar.shape[0])
+                avatar = cv2.resize(avatar, (avatar_width, avatar_height))
+            return avatar, entry
+
+        valid = [i for i, line in enumerate(data) if len(line) >= 3 and line[1].strip()]
+        lines = [data[i] for i in valid]
+        clips = [voice_clips[i] if voice_clips and i < len(voice_clips) else None for i in valid]
+        report.info['lines_total'] = len(lines)
+        volumes = {config[0]: float(config[3]) for config in configs if len(config) > 3 and config[3] != ''}
+
+        # 出场角色：按配置顺序，只包含有台词且有立绘的角色
+        with report.stage("asset_load"):
+            speakers = {line[1] for line in lines}
+            cast = {}
+            for char_name in avatar_files:
+                if char_name in speakers:
+                    loaded = load_avatar(char_name)
+                    if loaded:
+                        cast[char_name] = loaded
+            placements = stage_cast(cast, layout, scene)
+        report.info['cast'] = len(placements)
+
+        # 静态镜头和镜头运动共用舞台缓存和逐句流程，只是画面来源不同
+        stage = Stage(bg, cast, cast_files, placements, layout, lut, text_color, report, show_cast, fps)
+        if camera != 'none':
+            source = CameraFrames(stage, CameraPath((width, height), fps), camera_bg,
+                                  cv2.INTER_NEAREST if lut is not None or pixel_scale > 1 else cv2.INTER_LINEAR, report)
+        else:
+            source = StaticFrames(stage, report)
+        frames_per_line = int(fps * LINE_SECONDS)
+        transition_frames = min(int(fps * transition_seconds), frames_per_line)
+        pipeline = LinePipeline(source, TransitionRenderer((width, height)), out, report, layout, lut, transition,
+                                transition_frames, typewriter, typewriter_cps, fps, pixel_scale)
+
+        audio_clips = []  # [(开始秒数, 配音路径, 音量)]
+        frames_written = 0
+        start_time = time.perf_counter()
+        last_report = None
+        for index, line in enumerate(lines):
+            if cancel_event is not None and cancel_event.is_set():
+                out.abort()  # 不再编码已排队的帧
+                _remove_output(out.path)
+                yield _result(report, "cancelled", f"已取消（完成 {index}/{len(lines)} 句）", report_log,
+                              lines_done=index, lines_total=len(lines))
+                return
+
+            char_name = line[1]
+            text, action = parse_action(line[2])
+
+            with report.stage("text"):
+                # 用字形图集直接在帧上贴字；打字机模式下台词稍后逐字贴出
+                name_glyphs = name_atlas.layout(char_name, *layout.name_pos)
+                glyphs = text_atlas.layout(text, *layout.text_pos)
+
+            # 动作标记：过渡结束后按帧号播放烘焙好的动画
+            sheet = None
+            if action:
+                with report.stage("animation"):
+                    sheet = stage.sheet(char_name, action)
+            if sheet is not None:
+                report.count("animations")
+            plan = LinePlan(char_name, name_glyphs, glyphs, stage.avatar_rect(char_name), sheet)
+
+            # 有配音时台词至少持续到配音结束；打字机模式下至少持续到全部显示后再停留片刻
+            line_frames = max(frames_per_line, pipeline.reveal_frames(plan, TYPEWRITER_HOLD))
+            if clips[index]:
+                with report.stage("audio"):
+                    duration = clip_duration(clips[index])
+                line_frames = max(line_frames, int(np.ceil((duration + VOICE_PADDING) * fps)))
+                audio_clips.append((frames_written / fps, clips[index], volumes.get(char_name, 1.0)))
+
+            frame = pipeline.render(plan, line_frames)
+            frames_written += line_frames
+            report.count("frames", line_frames)
+            report.count("lines_done")
+
+            # 定期产出进度和预览
+            now = time.perf_counter()
+            if last_report is None or now - last_report >= PROGRESS_INTERVAL or index == len(lines) - 1:
+                last_report = now
+                elapsed = now - start_time
+                done = index + 1
+                yield _progress(
+                    "running",
+                    f"渲染中 {done}/{len(lines)} 句",
+                    lines_done=done,
+                    lines_total=len(lines),
+                    frames=frames_written,
+                    fps=frames_written / elapsed if elapsed > 0 else 0.0,
+                    eta=elapsed / done * (len(lines) - done),
+                    preview=_thumbnail(frame),
+                )
+
+        # 结束编码（ffmpeg 后端在此完成封装）
+        with report.stage("mux"):
+            out.close()
+
+        if (audio_clips or music) and out.path.is_file():
+            # 流式混音直接送入 ffmpeg 封装，不生成完整长度的中间音频文件
+            with report.stage("audio"):
+                mixer = AudioMixer(frames_written / fps, audio_clips,
+                                   MUSIC_ROOT / music if music else None, music_volume)
+                mux_audio(out.path, mixer)
+            report.info['audio_clips'] = len(audio_clips)
+
+        if not out.path.exists():
+            yield _result(report, "error", "视频文件未生成", report_log)
+            return
+        output_bytes = out.output_bytes()
+        report.info['output_bytes'] = output_bytes
+        if output_bytes == 0:
+            yield _result(report, "error", "视频文件大小为0", report_log)
+            return
+
+        if cache is not None:
+            with report.stage("cache"):
+                cache.put(cache_key, out.path, frames=frames_written, lines=len(lines))
+            report.info['render_cache'] = cache.stats()
+
+        completed = True
+        yield _result(report, "done", f"视频已生成: {video_path}（{settings['label']}）", report_log,
+                      video_path=video_path, lines_done=len(lines), lines_total=len(lines),
+                      frames=frames_written)
+
+    except Exception as e:
+        out.abort()
+        _remove_output(out.path)
+        yield _result(report, "error", f"生成失败: {str(e)}", report_log, e)
+        return
+    finally:
+        report.close()  # 生成器被提前关闭时也停止 tracemalloc
+        if not completed:
+            # abort 对已关闭或已中止的编码器不起作用，也不会抛出异常
+            out.abort()
+            _remove_output(out.path)
@@ -2,8 +2,13 @@ import pygame
 import pygame_gui
 import os
 from pathlib import Path
-import math
-import random
+import time
+from animation import AnimationEngine, CHANNEL_INDEX
+from sprite_batch import SpriteBatch
+from asset_index import get_index
+from scene_file import Scene, SCENES_DIR, character_entry
+from recorder import FrameRecorder
+from character_sprite import CharacterSprite
 
 class SceneEditor:
     def __init__(self):
@@ -19,8 +24,12 @@ class SceneEditor:
         self.avatar_path = self.assets_path / "avatar"
         self.bg_path = self.assets_path / "background"
         
+        # 场景文件
+        self.scene_file = SCENES_DIR / "scene.json"
+        
         # 场景状态
         self.background = None
+        self.background_file = None
         self.avatars = []  # [(surface, rect, selected), ...]
         self.characters = []  # 存储 CharacterSprite 实例
         self.selected_avatar = None
@@ -44,6 +53,14 @@ class SceneEditor:
         self.emotion_timer = 0
         self.emotion_surface = None
         
+        # 动画引擎和批量渲染器
+        self.animator = AnimationEngine()
+        self.sprite_batch = SpriteBatch(self.window_size)
+        
+        # 录屏（后台线程编码）
+        self.recorder = None
+        self.record_dir = Path("movies")
+        
         self._init_ui()
         self._load_default_background()
     
@@ -55,8 +72,29 @@ class SceneEditor:
             manager=self.manager
         )
         
-        # 角色列表区域
-        self.avatar_list_rect = pygame.Rect(10, 10, 120, self.window_size[1] - 20)
+        # 场景保存/加载按钮
+        self.save_scene_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect(self.window_size[0] - 220, 10, 100, 30),
+            text="Save",
+            manager=self.manager
+        )
+        self.load_scene_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect(self.window_size[0] - 330, 10, 100, 30),
+            text="Load",
+            manager=self.manager
+        )
+        self.record_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect(self.window_size[0] - 440, 10, 100, 30),
+            text="Record",
+            manager=self.manager
+        )
+        
+        # 角色列表区域（可滚动，角色数量不设上限）
+        self.avatar_list_rect = pygame.Rect(10, 10, 140, self.window_size[1] - 20)
+        self.avatar_list = pygame_gui.elements.UIScrollingContainer(
+            relative_rect=self.avatar_list_rect,
+            manager=self.manager
+        )
         self.avatar_buttons = []  # 存储角色按钮和删除按钮的列表 [(avatar_btn, delete_btn), ...]
         
         # 添加角色按钮（加号）
@@ -67,27 +105,23 @@ class SceneEditor:
         if hasattr(self, 'add_avatar_button'):
             self.add_avatar_button.kill()
         
-        # 只在角色数量未达到上限时显示加号按钮
-        if len(self.avatars) < 4:  # 修改为4个角色上限
-            # 计算新按钮位置
-            y_pos = 10 + len(self.avatar_buttons) * 130
-            self.add_avatar_button = pygame_gui.elements.UIButton(
-                relative_rect=pygame.Rect(10, y_pos, 120, 120),
-                text="+",
-                manager=self.manager
-            )
+        # 加号按钮始终位于列表末尾
+        y_pos = len(self.avatar_buttons) * 130
+        self.add_avatar_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect(0, y_pos, 120, 120),
+            text="+",
+            manager=self.manager,
+            container=self.avatar_list
+        )
+        self.avatar_list.set_scrollable_area_dimensions((120, y_pos + 120))
     
     def _load_default_background(self):
         # 加载第一个找到的背景图片
-        bg_files = list(self.bg_path.glob('*.jpg')) + list(self.bg_path.glob('*.jpg'))
+        bg_files = get_index().list('background', ('.jpg', '.png'))
         if bg_files:
-            self.background = pygame.image.load(str(bg_files[0]))
-            self.background = pygame.transform.scale(self.background, self.window_size)
+            self._load_background(bg_files[0])
     
     def add_avatar(self, avatar_file):
-        if len(self.avatars) >= 4:
-            return
-            
         avatar_path = self.avatar_path / avatar_file
         if avatar_path.exists():
             # 加载角色图片
@@ -98,14 +132,21 @@ class SceneEditor:
             
             # 创建角色精灵
             character = CharacterSprite(str(avatar_path))
+            # 同一立绘放置多次时名字加序号，保证场景中的角色名唯一
+            names = {c.name for c in self.characters}
+            base, n = character.name, 2
+            while character.name in names:
+                character.name = f"{base} ({n})"
+                n += 1
             self.characters.append(character)
             
             # 创建UI按钮
-            y_pos = 10 + len(self.avatar_buttons) * 130
+            y_pos = len(self.avatar_buttons) * 130
             avatar_btn = pygame_gui.elements.UIButton(
-                relative_rect=pygame.Rect(10, y_pos, 120, 120),
+                relative_rect=pygame.Rect(0, y_pos, 120, 120),
                 text="",
-                manager=self.manager
+                manager=self.manager,
+                container=self.avatar_list
             )
             
             # 设置预览图片
@@ -119,7 +160,8 @@ class SceneEditor:
             delete_btn = pygame_gui.elements.UIButton(
                 relative_rect=pygame.Rect(100, y_pos, 20, 20),
                 text="×",
-                manager=self.manager
+                manager=self.manager,
+                container=self.avatar_list
             )
             
             self.avatar_buttons.append((avatar_btn, delete_btn))
@@ -144,7 +186,7 @@ class SceneEditor:
         )
         
         path = self.avatar_path if resource_type == 'avatar' else self.bg_path
-        files = list(path.glob('*.png')) + list(path.glob('*.jpg'))
+        files = [path / name for name in get_index().list(resource_type, ('.png', '.jpg'))]
         
         btn_size = (80, 80)
         margin = 10
@@ -202,7 +244,7 @@ class SceneEditor:
         
         # 创建动作菜单窗口 - 增加宽度确保内容完整显示
         menu_width = len(self.actions) * 95 + 100  # 动作按钮宽度
-        menu_height = 45 + 150  # 调节面板高度
+        menu_height = 45 + 180  # 调节面板高度
         
         # 确保菜单不会超出窗口右边界
         menu_x = min(btn_rect.right + 10, self.window_size[0] - menu_width)
@@ -302,6 +344,21 @@ class SceneEditor:
                 object_id=f"@pose_{pose_id}"
             )
 
+        # 角色名（与台词中的角色名对应）
+        pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect(5, 135, 80, 20),
+            text="Name:",
+            manager=self.manager,
+            container=self.action_menu
+        )
+        name_entry = pygame_gui.elements.UITextEntryLine(
+            relative_rect=pygame.Rect(85, 132, 250, 26),
+            manager=self.manager,
+            container=self.action_menu,
+            object_id=f"@name_entry"
+        )
+        name_entry.set_text(self.characters[character_index].name)
+
     def handle_event(self, event):
         if event.type == pygame_gui.UI_BUTTON_PRESSED:
             print(f"Button pressed: {event.ui_element.object_ids}")  # 调试所有按钮点击
@@ -327,6 +384,12 @@ class SceneEditor:
                 self._create_resource_dialog('avatar')
             elif event.ui_element == self.change_bg_button:
                 self._create_resource_dialog('background')
+            elif event.ui_element == self.save_scene_button:
+                self.save_scene()
+            elif event.ui_element == self.load_scene_button:
+                self.load_scene()
+            elif event.ui_element == self.record_button:
+                self.toggle_recording()
             # 检查资源按钮点击
             elif hasattr(event.ui_element, 'object_ids'):
                 if any('#resource_' in id_ for id_ in event.ui_element.object_ids if id_):
@@ -370,7 +433,7 @@ class SceneEditor:
                     elif pose_id == "pose1":
                         # 开启呼吸动画
                         character._reset_pose()  # 先重置
-                        character.is_breathing = True
+                        character.play_animation('breath')
                     elif pose_id == "pose2":
                         # 吊儿郎当的姿势
                         character.set_pose({
@@ -381,7 +444,7 @@ class SceneEditor:
                             'left_leg': {'angle': -5},   # 一条腿微微弯曲
                             'right_leg': {'angle': 10}   # 另一条腿站立
                         })
-                        character.is_breathing = False  # 确保不会有呼吸动画
+                        character.stop_animation()  # 确保不会有呼吸动画
 
         elif event.type == pygame_gui.UI_WINDOW_CLOSE:
             if event.ui_element == self.resource_dialog:
@@ -411,6 +474,11 @@ class SceneEditor:
                 self.characters[self.selected_avatar].pos[0] = max(50, min(self.window_size[0] - 50, self.characters[self.selected_avatar].pos[0]))
                 self.characters[self.selected_avatar].pos[1] = max(100, min(self.window_size[1] - 50, self.characters[self.selected_avatar].pos[1]))
         
+        elif event.type == pygame_gui.UI_TEXT_ENTRY_CHANGED:
+            if (self.selected_character_index is not None and hasattr(event.ui_element, 'object_ids') and
+                    any('@name_entry' in id_ for id_ in event.ui_element.object_ids if id_)):
+                self.characters[self.selected_character_index].name = event.text.strip()
+
         elif event.type == pygame_gui.UI_HORIZONTAL_SLIDER_MOVED:
             if self.selected_character_index is not None:
                 character = self.characters[self.selected_character_index]
@@ -438,12 +506,94 @@ class SceneEditor:
         if bg_path.exists():
             self.background = pygame.image.load(str(bg_path))
             self.background = pygame.transform.scale(self.background, self.window_size)
+            self.background_file = bg_file
+    
+    def save_scene(self, path=None):
+        """保存当前场景布局到场景文件"""
+        path = path or self.scene_file
+        scene = Scene(self.window_size)
+        if self.background_file:
+            scene.background = scene.add_asset("background", self.background_file)
+        for character in self.characters:
+            # 保存基础姿势，而不是动画播放中某一帧的角度
+            parts = {name: {'pos': part['pos'], 'angle': float(character.pose[CHANNEL_INDEX[name]])}
+                     for name, part in character.parts.items()}
+            scene.characters.append(character_entry(
+                scene, character.original_file, character.pos,
+                character.head.get_width(), parts, name=character.name
+            ))
+        scene.save(path)
     
+    def load_scene(self, path=None):
+        """从场景文件恢复背景和角色"""
+        path = path or self.scene_file
+        if not path.exists():
+            return
+        scene = Scene.load(path)
+        
+        # 清空当前角色
+        for avatar_btn, delete_btn in self.avatar_buttons:
+            avatar_btn.kill()
+            delete_btn.kill()
+        self.avatar_buttons = []
+        self.avatars = []
+        self.characters = []
+        self.selected_avatar = None
+        self.selected_character_index = None
+        
+        if scene.background_file():
+            self._load_background(scene.background_file())
+        
+        # 编辑器尺寸与保存时不同则按比例换算位置
+        scale_x = self.window_size[0] / scene.size[0]
+        scale_y = self.window_size[1] / scene.size[1]
+        for entry in scene.characters:
+            avatar_file = scene.asset_file(entry["asset"])
+            before = len(self.characters)
+            self.add_avatar(avatar_file)
+            if len(self.characters) == before:
+                continue
+            character = self.characters[-1]
+            character.pos = [entry["pos"][0] * scale_x, entry["pos"][1] * scale_y]
+            if entry.get("name"):
+                character.name = entry["name"]
+            size = int(entry.get("head_size", character.head.get_width()))
+            if size != character.head.get_width():
+                original_head = pygame.image.load(str(self.avatar_path / avatar_file))
+                character.head = pygame.transform.scale(original_head, (size, size))
+            for part_name, (x, y, angle) in entry.get("parts", {}).items():
+                if part_name in character.parts:
+                    character.parts[part_name]['pos'] = [x, y]
+            character.set_pose({name: {'angle': values[2]} for name, values in entry.get("parts", {}).items()})
+        self._update_add_avatar_button()
+    
+    def toggle_recording(self):
+        """开始/停止录制编辑器画面；结果和错误显示在窗口标题上，与丢帧计数一致"""
+        if self.recorder is None:
+            self.record_dir.mkdir(parents=True, exist_ok=True)
+            path = self.record_dir / time.strftime("editor_%Y%m%d_%H%M%S")
+            try:
+                self.recorder = FrameRecorder(path, self.window_size)
+            except (RuntimeError, ValueError) as e:
+                pygame.display.set_caption(f"TTPV Scene Editor - recording failed: {e}")
+                return
+            self.record_button.set_text("Stop")
+            pygame.display.set_caption("TTPV Scene Editor [REC]")
+        else:
+            stats = self.recorder.stop()
+            self.recorder = None
+            self.record_button.set_text("Record")
+            if stats['error']:
+                pygame.display.set_caption(f"TTPV Scene Editor - recording error: {stats['error']}")
+            else:
+                pygame.display.set_caption(f"TTPV Scene Editor - saved {Path(stats['path']).name} "
+                                           f"({stats['frames']} frames, {stats['dropped']} dropped)")
+
     def _rearrange_avatar_buttons(self):
         # 重新排列所有角色按钮
         for i, (avatar_btn, delete_btn) in enumerate(self.avatar_buttons):
-            y_pos = 10 + i * 130
-            avatar_btn.set_relative_position((10, y_pos))
+            y_pos = i * 130
+            avatar_btn.set_relative_position((0, y_pos))
             delete_btn.set_relative_position((100, y_pos))
         
         # 更新加号按钮位置
@@ -452,6 +602,7 @@ class SceneEditor:
     def run(self):
         clock = pygame.time.Clock()
         running = True
+        dropped_shown = 0
         
         while running:
             time_delta = clock.tick(60)/1000.0
@@ -462,237 +613,28 @@ class SceneEditor:
                 
                 self.handle_event(event)
             
-            # 更新角色动画
-            for character in self.characters:
-                character.update(time_delta * 1000)  # 转换为毫秒
+            # 更新角色动画：按真实经过时间一次性求值，慢帧跳帧而不是变慢
+            self.animator.apply(self.characters, pygame.time.get_ticks())
             
             self.manager.update(time_delta)
             
-            # 绘制
-            if self.background:
-                self.window.blit(self.background, (0, 0))
-            
-            # 绘制所有角色
-            for character in self.characters:
-                character.draw(self.window)
+            # 绘制背景和所有角色：静止角色走缓存图层，其余部件合并为一次 blits
+            self.sprite_batch.draw(self.window, self.background, self.characters)
             
             self.manager.draw_ui(self.window)
+            
+            # 录制合成好的窗口画面；编码跟不上时丢帧计数，不阻塞主循环
+            if self.recorder is not None:
+                self.recorder.capture(self.window)
+                if self.recorder.dropped != dropped_shown:
+                    dropped_shown = self.recorder.dropped
+                    pygame.display.set_caption(f"TTPV Scene Editor [REC] {dropped_shown} dropped")
             pygame.display.update()
         
+        if self.recorder is not None:
+            self.toggle_recording()
         pygame.quit()
 
-class CharacterSprite:
-    def __init__(self, head_image):
-        self.original_file = Path(head_image).name  # 保存原始文件名
-        self.head = pygame.image.load(head_image)
-        self.head = pygame.transform.scale(self.head, (70, 70))
-        
-        # 身体部件颜色和尺寸
-        self.body_color = (60, 60, 60)
-        self.sizes = {
-            'body': (40, 60),
-            'neck': (6, 20),
-            'left_arm': (8, 50),
-            'right_arm': (8, 50),
-            'left_leg': (10, 60),
-            'right_leg': (10, 60)
-        }
-        
-        # 身体部件的相对位置和旋转角度
-        self.parts = {
-            'head': {'pos': [0, -65], 'angle': 0},
-            'neck': {'pos': [0, -40], 'angle': 0},
-            'body': {'pos': [0, 0], 'angle': 0},
-            'left_arm': {'pos': [-20, -30], 'pivot': 'top', 'angle': 0},
-            'right_arm': {'pos': [20, -30], 'pivot': 'top', 'angle': 0},
-            'left_leg': {'pos': [-15, 50], 'angle': 0},
-            'right_leg': {'pos': [15, 50], 'angle': 0}
-        }
-        
-        # 基础位置
-        self.pos = [400, 300]
-        self.base_offset = [0, 0]
-        
-        # 动画系统
-        self.current_animation = None
-        self.animation_time = 0
-        self.animation_frame = 0
-        self.is_breathing = False
-        self.animations = self._init_animations()
-        
-        # 表情系统
-        self.emotion_text = None
-        self.emotion_timer = 0
-        self.emotion_font = pygame.font.SysFont('segoe ui emoji', 32)  # 使用系统emoji字体
-    
-    def _init_animations(self):
-        return {
-            'wave': {
-                'frames': 6,  # 增加帧数使动作更流畅
-                'duration': 1200,  # 增加持续时间
-                'update': self._wave_update
-            },
-            'smile': {
-                'frames': 4,
-                'duration': 800,
-                'update': self._smile_update
-            },
-            'nod': {
-                'frames': 4,
-                'duration': 2000,
-                'update': self._nod_update
-            }
-        }
-    
-    def _wave_update(self, frame):
-        # 挥手动画
-        wave_angle = math.sin(frame * math.pi / 3) * 45  # 摆动幅度
-        self.parts['right_arm']['angle'] = -90 + wave_angle  # 基础角度-90度（举起），然后加上摆动
-        self.parts['head']['angle'] = math.sin(frame * math.pi / 3) * 5  # 轻微点头
-        
-        # 其他部位保持原位
-        self.parts['left_arm']['angle'] = 0
-        self.parts['body']['angle'] = 0
-        self.parts['left_leg']['angle'] = 0
-        self.parts['right_leg']['angle'] = 0
-    
-    def _smile_update(self, frame):
-        # 抖动动画
-        shake = random.randint(-2, 2)
-        self.base_offset = [shake, shake]
-        
-        # 显示表情
-        if frame == 0:
-            # 使用emoji表情
-            self.emotion_text = "😄"  # 也可以用 "^_^" 作为备选😃😄😁😆🤣😂😊🥰😝
-            self.emotion_timer = 2000  # 显示2秒
-    
-    def _nod_update(self, frame):
-        # 点头动画
-        progress = frame / 3  # 0 到 1 的进度
-        if progress <= 0.5:
-            nod_amount = progress * 2
-        else:
-            nod_amount = (1 - progress) * 2
-        
-        self.parts['head']['angle'] = nod_amount * 20
-        self.parts['neck']['angle'] = nod_amount * 10
-    
-    def draw(self, screen):
-        # 计算实际绘制位置
-        center_pos = (self.pos[0] + self.base_offset[0], 
-                     self.pos[1] + self.base_offset[1])
-        
-        # 绘制身体部件
-        self._draw_body_part(screen, center_pos, 'body')
-        self._draw_body_part(screen, center_pos, 'neck')
-        self._draw_body_part(screen, center_pos, 'left_leg')
-        self._draw_body_part(screen, center_pos, 'right_leg')
-        self._draw_body_part(screen, center_pos, 'left_arm')
-        self._draw_body_part(screen, center_pos, 'right_arm')
-        
-        # 绘制头部
-        head_pos = self._get_part_pos(center_pos, 'head')
-        head_rotated = pygame.transform.rotate(self.head, self.parts['head']['angle'])
-        head_rect = head_rotated.get_rect(center=head_pos)
-        screen.blit(head_rotated, head_rect)
-        
-        # 绘制表情（如果有）
-        if self.emotion_text and self.emotion_timer > 0:
-            emotion_surface = self.emotion_font.render(self.emotion_text, True, (0, 0, 0))
-            emotion_pos = (self.pos[0], self.pos[1] - 100)  # 在头顶上方显示
-            screen.blit(emotion_surface, 
-                       emotion_surface.get_rect(midbottom=emotion_pos))
-            self.emotion_timer -= 16  # 假设60FPS
-            if self.emotion_timer <= 0:
-                self.emotion_text = None
-    
-    def _draw_body_part(self, screen, center_pos, part_name):
-        if part_name not in self.sizes:
-            return
-            
-        width, height = self.sizes[part_name]
-        pos = self._get_part_pos(center_pos, part_name)
-        angle = self.parts[part_name]['angle']
-        
-        # 创建部件表面
-        surface = pygame.Surface((width, height), pygame.SRCALPHA)
-        pygame.draw.rect(surface, self.body_color, (0, 0, width, height))
-        
-        # 处理手臂的特殊旋转
-        if part_name in ['left_arm', 'right_arm']:
-            # 设置旋转中心点在顶部
-            rotated = pygame.transform.rotate(surface, angle)
-            if part_name == 'left_arm':
-                rect = rotated.get_rect(midtop=pos)
-            else:
-                rect = rotated.get_rect(midtop=pos)
-        else:
-            # 其他部件保持中心旋转
-            rotated = pygame.transform.rotate(surface, angle)
-            rect = rotated.get_rect(center=pos)
-        
-        screen.blit(rotated, rect)
-    
-    def _get_part_pos(self, center_pos, part_name):
-        part = self.parts[part_name]
-        angle_rad = math.radians(self.parts['body']['angle'])
-        
-        # 根据身体角度调整部件位置
-        x = part['pos'][0] * math.cos(angle_rad) - part['pos'][1] * math.sin(angle_rad)
-        y = part['pos'][0] * math.sin(angle_rad) + part['pos'][1] * math.cos(angle_rad)
-        
-        return (center_pos[0] + x, center_pos[1] + y)
-    
-    def update(self, dt):
-        if self.current_animation:
-            anim = self.animations[self.current_animation]
-            self.animation_time += dt
-            
-            frame_duration = anim['duration'] / anim['frames']
-            self.animation_frame = int(self.animation_time / frame_duration)
-            
-            if self.animation_frame < anim['frames']:
-                anim['update'](self.animation_frame)
-            else:
-                self.current_animation = None
-                self._reset_pose()
-        elif self.is_breathing:  # 只在呼吸状态时更新
-            self._breathing_update((pygame.time.get_ticks() % 3000) / 3000)
-    
-    def _breathing_update(self, progress):
-        # 轻微的呼吸动画
-        breath = math.sin(progress * 2 * math.pi) * 2
-        self.parts['body']['angle'] = breath * 0.5
-        self.parts['head']['angle'] = breath * 0.3
-        self.parts['left_arm']['angle'] = breath * 1
-        self.parts['right_arm']['angle'] = breath * 1
-        self.base_offset[1] = abs(breath) * 1  # 轻微上下移动
-    
-    def _reset_pose(self):
-        # 重置所有部件到默认位置
-        self.is_breathing = False  # 停止呼吸动画
-        for part in self.parts.values():
-            part['angle'] = 0
-        self.base_offset = [0, 0]
-        
-        # 设置默认姿势 - 自然站立
-        self.parts['left_arm']['angle'] = 0
-        self.parts['right_arm']['angle'] = 0
-        self.parts['left_leg']['angle'] = 0
-        self.parts['right_leg']['angle'] = 0
-
-    def play_animation(self, action_id):
-        self.current_animation = action_id
-        self.animation_time = 0
-        self.animation_frame = 0
-
-    def set_pose(self, pose_data):
-        for part_name, settings in pose_data.items():
-            if part_name in self.parts:
-                for key, value in settings.items():
-                    self.parts[part_name][key] = value
-
 if __name__ == "__main__":
     editor = SceneEditor()
     editor.run() 
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""场景文件：编辑器与视频渲染共用的紧凑 JSON 场景格式
+
+格式（version 1）:
+{
+  "version": 1,
+  "size": [800, 600],                       # 编辑时的画布尺寸，渲染时按比例换算位置
+  "assets": {"b0": ["background", "background_1.jpg"], "a0": ["avatar", "avatar_1.png"]},
+  "background": "b0",
+  "characters": [
+    {"asset": "a0", "name": "", "pos": [400, 300], "head_size": 70,
+     "parts": {"head": [0, -65, 0], ...}}    # 部件: [x偏移, y偏移, 角度]
+  ]
+}
+
+资源只在清单中登记文件名，解码由使用方负责（渲染器经 asset_store 读取预缩放的像素）。
+"""
+import json
+from pathlib import Path
+
+SCENE_VERSION = 1
+SCENES_DIR = Path("scenes")
+
+
+class Scene:
+    def __init__(self, size=(800, 600), background=None, characters=None, assets=None):
+        self.size = tuple(size)
+        self.assets = dict(assets or {})  # 资源ID -> (类型, 文件名)
+        self.background = background  # 资源ID
+        self.characters = list(characters or [])
+
+    def add_asset(self, kind, file_name):
+        """登记资源，返回资源ID（相同资源复用同一ID）"""
+        for asset_id, entry in self.assets.items():
+            if tuple(entry) == (kind, file_name):
+                return asset_id
+        asset_id = f"{kind[0]}{len(self.assets)}"
+        self.assets[asset_id] = (kind, file_name)
+        return asset_id
+
+    def asset_file(self, asset_id):
+        """资源ID对应的文件名"""
+        if asset_id not in self.assets:
+            return None
+        return self.assets[asset_id][1]
+
+    def background_file(self):
+        return self.asset_file(self.background)
+
+    def to_dict(self):
+        return {
+            "version": SCENE_VERSION,
+            "size": list(self.size),
+            "assets": {k: list(v) for k, v in self.assets.items()},
+            "background": self.background,
+            "characters": self.characters,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        version = data.get("version")
+        if version != SCENE_VERSION:
+            raise ValueError(f"不支持的场景文件版本: {version}")
+        assets = {k: tuple(v) for k, v in data.get("assets", {}).items()}
+        return cls(data.get("size", (800, 600)), data.get("background"), data.get("characters", []), assets)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':')), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def character_entry(scene, avatar_file, pos, head_size, parts, name=""):
+    """生成场景中的角色条目"""
+    return {
+        "asset": scene.add_asset("avatar", avatar_file),
+        "name": name,
+        "pos": [round(pos[0]), round(pos[1])],
+        "head_size": int(head_size),
+        "parts": {k: [round(v['pos'][0]), round(v['pos'][1]), round(v['angle'], 2)] for k, v in parts.items()},
+    }
+
+
+def list_scenes(folder=SCENES_DIR):
+    """列出场景目录中的场景文件"""
+    folder = Path(folder)
+    if not folder.exists():
+        return []
+    return sorted(f.name for f in folder.glob('*.json'))
+
+
+def find_character(scene, name, avatar_file):
+    """按角色名优先、立绘文件其次查找场景中的角色条目"""
+    for entry in scene.characters:
+        if name and entry.get("name") == name:
+            return entry
+    for entry in scene.characters:
+        if avatar_file and scene.asset_file(entry["asset"]) == avatar_file:
+            return entry
+    return None
@@ -0,0 +1,249 @@
+"""共享内存帧环：渲染进程与编码进程之间只传递槽位序号，像素不经过管道也不 pickle
+
+一块 multiprocessing.shared_memory 分成固定数量的帧槽位，整个渲染任务复用同一组槽位。
+生产者（渲染进程或渲染工作进程）领取空闲槽位、把帧直接写进去，再提交 (帧号, 槽位)；
+编码进程按帧号顺序就地读取槽位中的像素交给编码器，写完后归还槽位。
+
+每次提交可以带重复次数，静止画面只复制一次像素，由编码进程重复写入。
+提交按序号（帧号）从 0 开始连续编号。生产者只能领取帧号落在「下一个待编码帧号 + 槽位数」窗口内的槽位，
+多个工作进程按帧号交错分工（如帧号 % 进程数）时可以同时推进，也不会出现槽位全被靠后的帧占住的死锁。
+"""
+import multiprocessing as mp
+import queue
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from encoders import Encoder, ENCODERS, DEFAULT_ENCODER
+
+FRAME_SLOTS = 8  # 槽位数，即编码进程最多落后的帧数
+POLL_SECONDS = 0.5  # 等待槽位或结果时检查编码进程是否存活的间隔
+STARTUP_TIMEOUT = 60  # 编码进程启动并创建编码器的超时（秒）
+ABORT_TIMEOUT = 5  # 中止时等待编码进程退出的时间，超时直接终止
+
+
+class FrameRing:
+    """固定数量的共享内存帧槽位 (槽位数, 高, 宽, 3) BGR uint8
+
+    create 在当前进程分配共享内存；handle() 作为参数传给子进程后，子进程用 attach 打开同一组槽位。
+    """
+
+    def __init__(self, shm, size, slots, free, filled, encoded, cond, owner):
+        width, height = size
+        self.shm = shm
+        self.size = (width, height)
+        self.slots = slots
+        self.frames = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=shm.buf)
+        self.free = free  # 空闲槽位序号
+        self.filled = filled  # (帧号, 槽位, 重复次数)；None 表示全部提交完毕
+        self.encoded = encoded  # 下一个待编码的帧号，由 cond 保护
+        self.cond = cond
+        self.owner = owner
+
+    @classmethod
+    def create(cls, size, slots=FRAME_SLOTS, ctx=None):
+        ctx = ctx or mp.get_context('spawn')
+        width, height = size
+        shm = shared_memory.SharedMemory(create=True, size=slots * height * width * 3)
+        free = ctx.Queue()
+        for slot in range(slots):
+            free.put(slot)
+        return cls(shm, size, slots, free, ctx.Queue(), ctx.RawValue('q', 0), ctx.Condition(), owner=True)
+
+    def handle(self):
+        """在其他进程中打开帧环所需的参数（只能在创建子进程时传入）"""
+        return self.shm.name, self.size, self.slots, self.free, self.filled, self.encoded, self.cond
+
+    @classmethod
+    def attach(cls, handle):
+        name, size, slots, free, filled, encoded, cond = handle
+        return cls(shared_memory.SharedMemory(name=name), size, slots, free, filled, encoded, cond, owner=False)
+
+    def acquire(self, seq, timeout=None):
+        """为第 seq 帧领取空闲槽位，超时返回 None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            if not self.cond.wait_for(lambda: seq < self.encoded.value + self.slots, timeout):
+                return None
+        try:
+            return self.free.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            return None
+
+    def frame(self, slot):
+        """槽位的帧缓冲（共享内存视图）"""
+        return self.frames[slot]
+
+    def submit(self, seq, slot, repeat=1):
+        """提交写好的槽位，编码进程把它作为第 seq 帧写入 repeat 次"""
+        self.filled.put((seq, slot, repeat))
+
+    def finish(self):
+        """所有帧都已提交"""
+        self.filled.put(None)
+
+    def consume(self):
+        """编码进程：按帧号顺序产出 (帧视图, 重复次数)，处理完（取下一帧时）归还槽位"""
+        pending = {}
+        next_seq = self.encoded.value
+        while True:
+            item = self.filled.get()
+            if item is None:
+                break
+            seq, slot, repeat = item
+            pending[seq] = (slot, repeat)
+            while next_seq in pending:
+                slot, repeat = pending.pop(next_seq)
+                yield self.frames[slot], repeat
+                self.free.put(slot)
+                next_seq += 1
+                with self.cond:
+                    self.encoded.value = next_seq
+                    self.cond.notify_all()
+        if pending:
+            raise RuntimeError(f"帧号不连续：缺少第 {next_seq} 帧")
+
+    def close(self):
+        """关闭映射；创建方同时释放共享内存"""
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # 仍有外部视图引用时交给进程退出回收映射
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+
+
+def _encoder_main(handle, backend, path, fps, options, failed, aborted, results):
+    """编码进程：就地读取帧环中的帧写入编码后端；出错或中止后只归还槽位，避免生产者阻塞"""
+    ring = FrameRing.attach(handle)
+    encoder = None
+    error = None
+    try:
+        encoder = ENCODERS[backend](path, ring.size, fps, **options)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        failed.set()
+    results.put(('ready', error))
+
+    try:
+        for frame, repeat in ring.consume():
+            if error is not None or aborted.is_set():
+                continue
+            try:
+                encoder.write(frame, repeat)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                failed.set()
+            del frame
+    except RuntimeError as e:
+        error = error or str(e)
+
+    stats = {'frames': 0, 'bytes': 0}
+    if encoder is not None and aborted.is_set():
+        encoder.abort()
+    elif encoder is not None:
+        try:
+            encoder.close()
+            stats = {'frames': encoder.frames, 'bytes': encoder.output_bytes()}
+        except Exception as e:
+            error = error or f"{type(e).__name__}: {e}"
+    results.put(('done', dict(stats, error=error)))
+    ring.close()
+
+
+def _cleanup(ring, process):
+    """编码器未正常关闭时终止编码进程并释放共享内存"""
+    if process.is_alive():
+        process.terminate()
+        process.join(timeout=5)
+    ring.close()
+
+
+class ProcessEncoder(Encoder):
+    """在独立进程中运行编码后端（见 encoders.ENCODERS），帧经共享内存帧环传递
+
+    write 把帧写进空闲槽位后立即返回，编码与后续帧的合成并行进行；编码进程落后 slots 帧时 write 等待。
+    """
+
+    def __init__(self, path, size, fps, backend=DEFAULT_ENCODER, slots=FRAME_SLOTS, **options):
+        super().__init__(path, size, fps, **options)
+        if backend not in ENCODERS:
+            raise ValueError(f"未知的编码后端: {backend}")
+        self.backend = backend
+        ctx = mp.get_context('spawn')  # 不继承渲染进程中 cv2/ffmpeg 的线程状态
+        self.ring = FrameRing.create(self.size, slots, ctx)
+        self._failed = ctx.Event()
+        self._aborted = ctx.Event()
+        self._results = ctx.Queue()
+        self.process = ctx.Process(target=_encoder_main, daemon=True, args=(
+            self.ring.handle(), backend, str(self.path), fps, options, self._failed, self._aborted,
+            self._results))
+        self._seq = 0  # 下一次提交的序号
+        self.process.start()
+        self._finalizer = weakref.finalize(self, _cleanup, self.ring, self.process)
+        self._stats = None
+
+        _, error = self._receive(STARTUP_TIMEOUT)
+        if error is not None:
+            try:
+                self.close()
+            except RuntimeError:
+                pass
+            raise RuntimeError(f"编码进程启动失败: {error}")
+
+    def _receive(self, timeout=None):
+        """等待编码进程的下一条消息；编码进程已退出时返回错误"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                return self._results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    break
+        return None, "编码进程无响应或意外退出"
+
+    def write(self, frame, repeat=1):
+        if self._failed.is_set() and self._stats is None:
+            self.close()  # 抛出编码进程中的错误
+        if self._stats is not None:
+            raise RuntimeError("编码器已关闭")
+        slot = None
+        while slot is None:
+            slot = self.ring.acquire(self._seq, timeout=POLL_SECONDS)
+            if slot is None and not self.process.is_alive():
+                raise RuntimeError("编码进程意外退出")
+        np.copyto(self.ring.frame(slot), frame)
+        self.ring.submit(self._seq, slot, repeat)
+        self._seq += 1
+        self.frames += repeat
+
+    def _shutdown(self, timeout=None):
+        """通知编码进程没有更多帧并等待它报告结果，然后释放帧环"""
+        self.ring.finish()
+        _, self._stats = self._receive(timeout)
+        if not isinstance(self._stats, dict):
+            self._stats = {'error': self._stats}
+        self.process.join(timeout=5)
+        self._finalizer()
+
+    def close(self):
+        """等待编码进程写完剩余帧并关闭输出；编码出错时抛出 RuntimeError"""
+        if self._stats is None:
+            self._shutdown()
+            if self._stats.get('error'):
+                raise RuntimeError(f"编码失败: {self._stats['error']}")
+
+    def abort(self):
+        """编码进程跳过尚未编码的帧并中止后端；超时未退出则直接终止"""
+        if self._stats is None:
+            self._aborted.set()
+            self._shutdown(ABORT_TIMEOUT)
+
+    def output_bytes(self):
+        if self._stats and 'bytes' in self._stats:
+            return self._stats['bytes']
+        return super().output_bytes()
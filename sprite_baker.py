@@ -0,0 +1,181 @@
+"""角色动画烘焙：用 pygame（不打开窗口）把 CharacterSprite 的动画逐帧渲染成 BGRA 帧序列
+
+烘焙结果按 (头部图片内容哈希, 姿势, 动画定义, 帧率, 尺寸) 缓存为 .npz 精灵表，
+视频渲染时按帧号取帧，渲染循环中不需要 pygame。
+
+烘焙: python sprite_baker.py avatar_1.png smile [--fps 30] [--head 70] [--no-body]
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from animation import AnimationEngine, ANIMATIONS, CHANNEL_INDEX
+from asset_index import get_index
+from asset_store import STORE_ROOT
+
+SPRITE_ROOT = STORE_ROOT / "sprites"
+BAKE_VERSION = 3
+EDITOR_HEAD_SIZE = 70  # CharacterSprite 的头部大小，身体部件尺寸以此为准
+
+
+def _init_pygame():
+    """只初始化字体模块（用于表情）；绘制和缩放都在内存 Surface 上进行，不需要显示设备"""
+    import pygame
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return pygame
+
+
+def bake_key(head_hash, animation, pose, fps, head_height, body):
+    """烘焙缓存键：任一输入（包括动画关键帧定义）变化都会生成新的精灵表"""
+    spec = {
+        "version": BAKE_VERSION,
+        "head": head_hash,
+        "animation": animation,
+        "definition": ANIMATIONS[animation],
+        "pose": pose or {},
+        "fps": fps,
+        "head_height": head_height,
+        "body": body,
+    }
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def sheet_path(avatar_file, animation, key):
+    return SPRITE_ROOT / f"{Path(avatar_file).stem}_{animation}_{key[:16]}.npz"
+
+
+def render_frames(avatar_file, animation, pose=None, fps=30, head_height=EDITOR_HEAD_SIZE, body=True):
+    """逐帧渲染动画，返回 (帧 (n, 高, 宽, 4) BGRA, 锚点 (x, y))
+
+    pose 为场景文件中的部件格式 {部件: [x偏移, y偏移, 角度]}。body=False 时只画头部，
+    头部按原图宽高比缩放到 head_height，锚点为头部中心；否则锚点为角色位置（身体中心）。
+    """
+    pygame = _init_pygame()
+    from character_sprite import CharacterSprite
+
+    path = get_index().get("avatar", avatar_file)["path"]
+    sprite = CharacterSprite(path)
+    for part_name, (x, y, angle) in (pose or {}).items():
+        if part_name in sprite.parts:
+            sprite.parts[part_name]['pos'] = [x, y]
+    sprite.set_pose({name: {'angle': values[2]} for name, values in (pose or {}).items()})
+
+    # 按头部大小等比放大身体部件和偏移
+    scale = head_height / EDITOR_HEAD_SIZE
+    original = pygame.image.load(path)
+    if body:
+        sprite.head = pygame.transform.smoothscale(original, (head_height, head_height))
+        for part_name, (w, h) in sprite.sizes.items():
+            sprite.sizes[part_name] = (max(int(w * scale), 1), max(int(h * scale), 1))
+        for part in sprite.parts.values():
+            part['pos'] = [part['pos'][0] * scale, part['pos'][1] * scale]
+    else:
+        width = max(int(original.get_width() * head_height / original.get_height()), 1)
+        sprite.head = pygame.transform.smoothscale(original, (width, head_height))
+        sprite.parts['head']['pos'] = [0, 0]
+
+    # 同一片段的所有帧一次求值：每帧相当于一个开始时间不同的角色
+    engine = AnimationEngine()
+    duration = float(ANIMATIONS[animation]['duration'])
+    count = int(np.ceil(duration * fps / 1000)) + 1
+    times = np.arange(count) * 1000.0 / fps
+    clips = np.full(count, engine.index[animation])
+    values, _ = engine.evaluate(0, clips, -times, np.repeat(sprite.pose[None], count, axis=0))
+    offsets = [CHANNEL_INDEX['offset_x'], CHANNEL_INDEX['offset_y']]
+    values[:, offsets] *= scale
+
+    # 画布只需容纳任意角度的头部（或身体）、晃动偏移和头顶的表情
+    head_size = sprite.head.get_size()
+    reach = int(np.ceil(np.abs(values[:, offsets]).max()))
+    if body:
+        extent = max(head_size) * 3 + 2 * reach
+    else:
+        extent = int(np.hypot(*head_size)) + 2 * (reach + sprite.emotion_font.get_height())
+    canvas = pygame.Surface((extent, extent), pygame.SRCALPHA)
+    sprite.pos = [extent // 2, extent // 2]
+
+    # 逐帧只保留非透明区域，最后拼到所有帧的外接矩形内，内存与画布大小无关
+    sprite.play_animation(animation, now_ms=0)
+    crops = []
+    for i in range(count):
+        canvas.fill((0, 0, 0, 0))
+        sprite.apply_channels(values[i], times[i])
+        sprite.draw(canvas, body=body)
+        alpha = pygame.surfarray.pixels_alpha(canvas)
+        xs, ys = np.nonzero(alpha)  # surfarray 为 (x, y) 顺序
+        if len(xs) == 0:
+            del alpha
+            crops.append(None)
+            continue
+        x0, x1, y0, y1 = xs.min(), xs.max() + 1, ys.min(), ys.max() + 1
+        rgb = pygame.surfarray.pixels3d(canvas)
+        crop = np.empty((y1 - y0, x1 - x0, 4), dtype=np.uint8)
+        crop[:, :, :3] = rgb[x0:x1, y0:y1].transpose(1, 0, 2)[:, :, ::-1]
+        crop[:, :, 3] = alpha[x0:x1, y0:y1].T
+        del rgb, alpha  # 释放对 Surface 的锁定
+        crops.append((crop, x0, y0))
+
+    visible = [c for c in crops if c is not None]
+    if not visible:
+        return np.zeros((count, 1, 1, 4), dtype=np.uint8), (sprite.pos[0], sprite.pos[1])
+    left = min(x for _, x, _ in visible)
+    top = min(y for _, _, y in visible)
+    right = max(x + c.shape[1] for c, x, _ in visible)
+    bottom = max(y + c.shape[0] for c, _, y in visible)
+    frames = np.zeros((count, bottom - top, right - left, 4), dtype=np.uint8)
+    for i, item in enumerate(crops):
+        if item is not None:
+            crop, x, y = item
+            frames[i, y - top:y - top + crop.shape[0], x - left:x - left + crop.shape[1]] = crop
+    return frames, (sprite.pos[0] - left, sprite.pos[1] - top)
+
+
+def bake(avatar_file, animation, pose=None, fps=30, head_height=EDITOR_HEAD_SIZE, body=True):
+    """返回缓存的精灵表 (帧, 锚点)，缺失时烘焙并写入缓存；立绘不存在时返回 None"""
+    if animation not in ANIMATIONS:
+        raise ValueError(f"未知的动画: {animation}")
+    head_hash = get_index().content_hash("avatar", avatar_file)
+    if head_hash is None:
+        return None
+    key = bake_key(head_hash, animation, pose, fps, head_height, body)
+    path = sheet_path(avatar_file, animation, key)
+    if path.exists():
+        with np.load(path) as sheet:
+            return sheet["frames"], tuple(int(v) for v in sheet["anchor"])
+
+    frames, anchor = render_frames(avatar_file, animation, pose, fps, head_height, body)
+    # 先写临时文件再原子替换
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+    np.savez_compressed(tmp, frames=frames, anchor=np.array(anchor, dtype=np.int32))
+    os.replace(tmp, path)
+    return frames, tuple(int(v) for v in anchor)
+
+
+def is_baked(avatar_file, animation, pose=None, fps=30, head_height=EDITOR_HEAD_SIZE, body=True):
+    """精灵表是否已在缓存中"""
+    head_hash = get_index().content_hash("avatar", avatar_file)
+    if head_hash is None:
+        return False
+    return sheet_path(avatar_file, animation, bake_key(head_hash, animation, pose, fps, head_height, body)).exists()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="烘焙角色动画精灵表")
+    parser.add_argument("avatar")
+    parser.add_argument("animations", nargs="*", default=list(ANIMATIONS))
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--head", type=int, default=EDITOR_HEAD_SIZE)
+    parser.add_argument("--no-body", action="store_true")
+    args = parser.parse_args()
+    for name in args.animations:
+        result = bake(args.avatar, name, fps=args.fps, head_height=args.head, body=not args.no_body)
+        if result is None:
+            raise SystemExit(f"未找到立绘: {args.avatar}")
+        frames, anchor = result
+        print(f"{name}: {len(frames)} 帧 {frames.shape[2]}x{frames.shape[1]}，锚点 {anchor}")
@@ -0,0 +1,115 @@
+"""批量角色渲染：所有角色部件收集后一次 blits 提交，静止角色烘焙到缓存图层"""
+import math
+import pygame
+
+# 部件绘制顺序（头部最后绘制）
+BODY_PARTS = ('body', 'neck', 'left_leg', 'right_leg', 'left_arm', 'right_arm')
+TOP_PIVOT_PARTS = ('left_arm', 'right_arm')
+
+# 旋转缓存上限，超过后整体清空（头像大小调整会产生新的头部表面）
+MAX_CACHE_SIZE = 4096
+
+
+class SpriteBatch:
+    def __init__(self, size):
+        self.size = size
+        self._part_cache = {}
+        self._head_cache = {}
+        self._static_layer = None
+        self._static_key = None
+        self.stats = {'static': 0, 'dynamic': 0, 'blits': 0, 'rebakes': 0}
+
+    def _part_surface(self, size, color, angle):
+        key = (size, color, angle)
+        surface = self._part_cache.get(key)
+        if surface is None:
+            if len(self._part_cache) >= MAX_CACHE_SIZE:
+                self._part_cache.clear()
+            base = pygame.Surface(size, pygame.SRCALPHA)
+            base.fill(color)
+            surface = pygame.transform.rotate(base, angle)
+            self._part_cache[key] = surface
+        return surface
+
+    def _head_surface(self, head, angle):
+        key = (head, angle)
+        surface = self._head_cache.get(key)
+        if surface is None:
+            if len(self._head_cache) >= MAX_CACHE_SIZE:
+                self._head_cache.clear()
+            surface = pygame.transform.rotate(head, angle)
+            self._head_cache[key] = surface
+        return surface
+
+    def collect(self, character, out):
+        """把角色的所有部件 (surface, 位置) 追加到 out"""
+        parts = character.parts
+        cx = character.pos[0] + character.base_offset[0]
+        cy = character.pos[1] + character.base_offset[1]
+        body_rad = math.radians(parts['body']['angle'])
+        cos_a, sin_a = math.cos(body_rad), math.sin(body_rad)
+
+        for name in BODY_PARTS:
+            part = parts[name]
+            px, py = part['pos']
+            x = cx + px * cos_a - py * sin_a
+            y = cy + px * sin_a + py * cos_a
+            surface = self._part_surface(character.sizes[name], character.body_color, round(part['angle']))
+            w, h = surface.get_size()
+            if name in TOP_PIVOT_PARTS:
+                out.append((surface, (x - w // 2, y)))
+            else:
+                out.append((surface, (x - w // 2, y - h // 2)))
+
+        px, py = parts['head']['pos']
+        x = cx + px * cos_a - py * sin_a
+        y = cy + px * sin_a + py * cos_a
+        surface = self._head_surface(character.head, round(parts['head']['angle']))
+        w, h = surface.get_size()
+        out.append((surface, (x - w // 2, y - h // 2)))
+
+    @staticmethod
+    def _static_key_of(character):
+        return (
+            character.head,
+            tuple(character.pos),
+            tuple(character.base_offset),
+            tuple((tuple(p['pos']), round(p['angle'])) for p in character.parts.values()),
+        )
+
+    def _bake_static(self, background, static):
+        layer = pygame.Surface(self.size).convert() if pygame.display.get_surface() else pygame.Surface(self.size)
+        if background:
+            layer.blit(background, (0, 0))
+        seq = []
+        for character in static:
+            self.collect(character, seq)
+        layer.blits(seq, doreturn=False)
+        self.stats['rebakes'] += 1
+        return layer
+
+    def draw(self, screen, background, characters):
+        """绘制背景和所有角色：静止角色走缓存图层，动画中的角色合并为一次 blits"""
+        static = [c for c in characters if c.current_animation is None]
+        dynamic = [c for c in characters if c.current_animation is not None]
+
+        key = (background, tuple(self._static_key_of(c) for c in static))
+        if key != self._static_key:
+            self._static_layer = self._bake_static(background, static)
+            self._static_key = key
+        screen.blit(self._static_layer, (0, 0))
+
+        seq = []
+        for character in dynamic:
+            self.collect(character, seq)
+        blit_all = getattr(screen, 'fblits', None)
+        if blit_all is not None:
+            blit_all(seq)
+        else:
+            screen.blits(seq, doreturn=False)
+
+        for character in characters:
+            if character.emotion_text:
+                character.draw_emotion(screen)
+
+        self.stats.update(static=len(static), dynamic=len(dynamic), blits=len(seq))
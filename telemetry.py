@@ -0,0 +1,179 @@
+"""渲染遥测：记录每次渲染各阶段的耗时、内存占用、帧数和缓存命中率"""
+import ctypes
+import json
+import os
+import platform
+import time
+import tracemalloc
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_process = psutil.Process() if psutil is not None else None
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    """Windows PROCESS_MEMORY_COUNTERS"""
+    _fields_ = [
+        ('cb', ctypes.c_ulong),
+        ('PageFaultCount', ctypes.c_ulong),
+        ('PeakWorkingSetSize', ctypes.c_size_t),
+        ('WorkingSetSize', ctypes.c_size_t),
+        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+        ('PagefileUsage', ctypes.c_size_t),
+        ('PeakPagefileUsage', ctypes.c_size_t),
+    ]
+
+
+def _windows_memory():
+    """Windows 上的 (工作集, 峰值工作集) 字节数，失败返回 None"""
+    counters = _ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        kernel32 = ctypes.windll.kernel32
+        psapi = ctypes.windll.psapi
+        psapi.GetProcessMemoryInfo.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong]
+        kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.WorkingSetSize, counters.PeakWorkingSetSize
+
+
+def current_rss():
+    """当前常驻内存（字节），优先用 psutil；不支持的平台返回 None"""
+    if _process is not None:
+        return _process.memory_info().rss
+    if platform.system() == 'Windows':
+        memory = _windows_memory()
+        return memory[0] if memory else None
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """进程峰值常驻内存（字节），不支持的平台返回 None"""
+    if resource is None:
+        memory = _windows_memory()
+        return memory[1] if memory else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+class RenderReport:
+    """一次渲染的结构化报告
+
+    stage() 累计各阶段耗时，并记录阶段结束时 RSS 的最大值（rss_at_exit，不是阶段内的峰值；
+    整个进程的峰值见 peak_rss）；trace_memory=True 时额外用 tracemalloc 记录每个阶段的
+    Python 内存分配峰值（有额外开销），finish 或 close 时停止跟踪。
+    """
+
+    def __init__(self, trace_memory=False, **info):
+        self.info = info
+        self.stages = {}
+        self.counters = {}
+        self.status = 'running'
+        self.message = ''
+        self.error = None
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self._start = time.perf_counter()
+        self._end = None
+        self._owns_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段；同名阶段多次进入时累加"""
+        entry = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'rss_at_exit': None, 'alloc_peak': None})
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry['seconds'] += time.perf_counter() - start
+            entry['calls'] += 1
+            rss = current_rss()
+            if rss is not None:
+                entry['rss_at_exit'] = max(entry['rss_at_exit'] or 0, rss)
+            if self.trace_memory and tracemalloc.is_tracing():
+                alloc = tracemalloc.get_traced_memory()[1]
+                entry['alloc_peak'] = max(entry['alloc_peak'] or 0, alloc)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def cache(self, name, hit):
+        """记录一次缓存查询"""
+        self.count(f'{name}_hits' if hit else f'{name}_misses')
+
+    def cache_rates(self):
+        """各缓存的命中率"""
+        rates = {}
+        for key in self.counters:
+            if key.endswith('_hits') or key.endswith('_misses'):
+                name = key.rsplit('_', 1)[0]
+                hits = self.counters.get(f'{name}_hits', 0)
+                total = hits + self.counters.get(f'{name}_misses', 0)
+                rates[name] = hits / total if total else None
+        return rates
+
+    def finish(self, status, message='', exc=None):
+        self.status = status
+        self.message = message
+        self._end = time.perf_counter()
+        if exc is not None:
+            self.error = {
+                'type': type(exc).__name__,
+                'message': str(exc),
+                'traceback': ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+            }
+        self.close()
+
+    def close(self):
+        """停止本报告启动的 tracemalloc；可重复调用"""
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at,
+            'status': self.status,
+            'message': self.message,
+            'error': self.error,
+            'wall_seconds': (self._end or time.perf_counter()) - self._start,
+            'stages': self.stages,
+            'counters': self.counters,
+            'cache_hit_rates': self.cache_rates(),
+            'peak_rss': peak_rss(),
+            **self.info,
+        }
+
+    def append_jsonl(self, path):
+        """追加一行 JSON 到日志文件"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_dict(), ensure_ascii=False) + '\n')
@@ -0,0 +1,66 @@
+"""台词切换过渡效果
+
+前后两句的关键帧只在少数区域（对话框、说话角色立绘）不同，淡入淡出以后一句关键帧为底，
+每帧只重写这块 ROI，每句增加的开销是固定的：一次整帧拷贝 + 过渡帧数 × ROI 大小。
+滑动则整帧推入：只滑动 ROI 会把其中的背景一起移走，在静止的背景上留下矩形接缝。
+"""
+import cv2
+import numpy as np
+
+TRANSITIONS = {
+    'cut': '直接切换',
+    'crossfade': '淡入淡出',
+    'slide': '滑动',
+}
+DEFAULT_TRANSITION = 'cut'
+
+
+def union_rect(rects, width, height):
+    """多个 (x0, y0, x1, y1) 矩形的外接矩形，裁剪到画面内；全部为空时返回 None"""
+    rects = [r for r in rects if r is not None]
+    if not rects:
+        return None
+    x0 = max(min(r[0] for r in rects), 0)
+    y0 = max(min(r[1] for r in rects), 0)
+    x1 = min(max(r[2] for r in rects), width)
+    y1 = min(max(r[3] for r in rects), height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+class TransitionRenderer:
+    """复用同一块帧缓冲生成过渡帧"""
+
+    def __init__(self, size):
+        width, height = size
+        self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+
+    def blend(self, kind, prev, nxt, roi, progress, refresh=True):
+        """单个过渡帧（progress 为 0~1，返回的是同一缓冲，写出后即被覆盖）
+
+        refresh 为 False 表示 nxt 与上一次调用时相同，ROI 以外的部分已在缓冲中，省去整帧拷贝。
+        """
+        if refresh:
+            np.copyto(self.buffer, nxt)
+        if kind != 'cut' and roi is not None:
+            self._blend_roi(kind, prev, nxt, roi, progress)
+        return self.buffer
+
+    def _blend_roi(self, kind, prev, nxt, roi, progress):
+        if kind == 'slide':
+            roi = (0, 0, self.buffer.shape[1], self.buffer.shape[0])
+        x0, y0, x1, y1 = roi
+        dst = self.buffer[y0:y1, x0:x1]
+        src_prev = prev[y0:y1, x0:x1]
+        src_next = nxt[y0:y1, x0:x1]
+        roi_width = x1 - x0
+        if kind == 'crossfade':
+            cv2.addWeighted(src_prev, 1 - progress, src_next, progress, 0, dst=dst)
+        elif kind == 'slide':
+            # 新画面从右侧整帧推入，旧画面向左移出
+            offset = int(round(roi_width * progress))
+            dst[:, :roi_width - offset] = src_prev[:, offset:]
+            dst[:, roi_width - offset:] = src_next[:, :offset]
+        else:
+            raise ValueError(f"未知的过渡效果: {kind}")
@@ -0,0 +1,260 @@
+"""语音合成进程池：常驻的 pyttsx3 工作进程把台词合成为 WAV 文件
+
+每个工作进程只初始化一次引擎，音色/语速/音量只在变化时重新设置；请求在本进程排队，
+经各工作进程独占的管道分发，结果以 concurrent.futures.Future 返回，调用方等待超过 TTS_TIMEOUT 后可用 cancel 取消。
+相同参数的合成结果按内容哈希缓存，重复试听直接返回已有文件；缓存总大小超过配额时按最近使用时间
+（命中时更新文件修改时间）淘汰。超时或取消正在合成的请求时，对应的工作进程会被终止并重启，
+不会一直占住请求线程。
+"""
+import atexit
+import collections
+import hashlib
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import connection as mp_connection
+from pathlib import Path
+
+TTS_CACHE_DIR = Path("movies") / "tts"
+TTS_WORKERS = 2
+TTS_TIMEOUT = 30  # 单次合成超时（秒）
+TTS_CACHE_QUOTA = 512 * 1024 ** 2  # 缓存总大小上限（字节）
+TTS_CACHE_MIN_AGE = 3600  # 最近这段时间内用过的配音不淘汰（秒），批量合成后渲染时仍要读取
+
+
+def tts_cache_path(voice, rate, volume, text):
+    """合成结果的缓存路径，由全部合成参数决定"""
+    key = f"{voice}\0{int(rate)}\0{float(volume):.2f}\0{text}"
+    return TTS_CACHE_DIR / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]}.wav"
+
+
+def trim_tts_cache(root=TTS_CACHE_DIR, quota=TTS_CACHE_QUOTA, min_age=TTS_CACHE_MIN_AGE):
+    """按最近使用时间（文件修改时间）淘汰缓存，直到总大小不超过配额，返回淘汰的文件数"""
+    files = []
+    for path in Path(root).glob("*.wav"):
+        if '.tmp.' in path.name:
+            continue  # 合成中的临时文件
+        try:
+            stat = path.stat()
+        except OSError:
+            continue  # 已被其他进程淘汰
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - min_age
+    evicted = 0
+    for mtime, size, path in sorted(files):
+        if total <= quota or mtime > cutoff:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def _worker_main(conn):
+    """工作进程：复用同一个引擎处理管道中的请求，每个工作进程独占一条管道"""
+    import pyttsx3
+
+    engine = pyttsx3.init()
+    voice_ids = {v.name: v.id for v in engine.getProperty('voices')}
+    current = {}
+
+    def configure(name, value):
+        if current.get(name) != value:
+            engine.setProperty(name, value)
+            current[name] = value
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        job_id, voice, rate, volume, text, path = job
+        try:
+            if voice in voice_ids:
+                configure('voice', voice_ids[voice])
+            configure('rate', int(rate))
+            configure('volume', float(volume))
+            # 先写临时文件再替换，取消时不会留下半个 WAV
+            tmp = f"{path}.{os.getpid()}.tmp.wav"
+            engine.save_to_file(text, tmp)
+            engine.runAndWait()
+            os.replace(tmp, path)
+            conn.send((job_id, 'done', path))
+        except Exception as e:
+            conn.send((job_id, 'error', f"{type(e).__name__}: {e}"))
+
+
+class TTSPool:
+    """常驻语音合成进程池
+
+    请求由本进程排队并逐个分派给空闲的工作进程。每个工作进程有自己的双向管道，
+    终止卡住的工作进程只会丢弃它自己的管道，不影响其他工作进程。
+    """
+
+    def __init__(self, workers=TTS_WORKERS):
+        self._ctx = mp.get_context('spawn')  # SAPI/COM 不能跨 fork 使用
+        self._workers = [None] * workers  # (进程, 管道)
+        self._running = [None] * workers  # 工作进程正在合成的任务ID
+        self._pending = collections.deque()  # 等待分派的请求
+        self._jobs = {}  # 任务ID -> Future
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        # 工作进程变化或关闭时唤醒分派线程
+        self._wakeup_reader, self._wakeup = self._ctx.Pipe(duplex=False)
+        for index in range(workers):
+            self._start_worker(index)
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def _start_worker(self, index):
+        conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers[index] = (process, conn)
+        self._running[index] = None
+
+    def _restart_worker(self, index):
+        """终止工作进程并换上新的（调用方持有 _lock）"""
+        process, conn = self._workers[index]
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+        conn.close()
+        if self._closed:
+            self._running[index] = None
+        else:
+            self._start_worker(index)
+        self._wakeup.send(None)
+
+    def _assign(self):
+        """把排队的请求分派给空闲的工作进程（调用方持有 _lock）"""
+        for index, (_, conn) in enumerate(self._workers):
+            if not self._pending:
+                break
+            if self._running[index] is None:
+                job = self._pending.popleft()
+                self._running[index] = job[0]
+                conn.send(job)
+
+    def _dispatch(self):
+        """把工作进程的结果交给对应的 Future；工作进程意外退出时让其任务失败并重启"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    break
+                workers = list(enumerate(self._workers))
+            waitables = {self._wakeup_reader: None}
+            for index, (process, conn) in workers:
+                waitables[conn] = (index, process, conn)
+                waitables[process.sentinel] = (index, process, conn)
+            for ready in mp_connection.wait(list(waitables)):
+                if ready is self._wakeup_reader:
+                    self._wakeup_reader.recv()
+                    continue
+                index, process, conn = waitables[ready]
+                try:
+                    message = conn.recv() if ready is conn else None
+                except (EOFError, OSError):
+                    message = None
+                with self._lock:
+                    if self._closed or self._workers[index] != (process, conn):
+                        continue  # 工作进程已被重启
+                    if message is None:
+                        job_id = self._running[index]
+                        payload = "工作进程意外退出"
+                        state = 'error'
+                        self._restart_worker(index)
+                    else:
+                        job_id, state, payload = message
+                        self._running[index] = None
+                    future = self._jobs.pop(job_id, None)
+                    self._assign()
+                if state == 'done':
+                    try:
+                        trim_tts_cache()  # 已取消的请求也写入了缓存
+                    except OSError:
+                        pass  # 淘汰失败只会让缓存暂时超出配额
+                if future is None or future.cancelled():
+                    continue
+                if state == 'done':
+                    future.set_result(Path(payload))
+                else:
+                    future.set_exception(RuntimeError(f"语音合成失败: {payload}"))
+
+    def submit(self, voice, rate, volume, text):
+        """提交合成请求，返回结果为 WAV 路径的 Future；已有缓存时立即完成"""
+        future = Future()
+        path = tts_cache_path(voice, rate, volume, text)
+        if path.exists():
+            try:
+                os.utime(path)  # 记录最近使用时间，淘汰时保留常用的配音
+            except OSError:
+                pass
+            future.set_result(path)
+            return future
+        if self._closed:
+            raise RuntimeError("语音合成进程池已关闭")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            job_id = next(self._ids)
+            self._jobs[job_id] = future
+            self._pending.append((job_id, voice, rate, volume, text, str(path)))
+            self._assign()
+        future.job_id = job_id
+        return future
+
+    def cancel(self, future):
+        """取消请求：排队中的直接移除，正在合成的重启执行它的那个工作进程"""
+        job_id = getattr(future, 'job_id', None)
+        with self._lock:
+            if self._jobs.pop(job_id, None) is None:
+                return False
+            for job in self._pending:
+                if job[0] == job_id:
+                    self._pending.remove(job)
+                    break
+            if job_id in self._running:
+                self._restart_worker(self._running.index(job_id))
+                self._assign()
+        future.cancel()
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.send(None)
+        self._dispatcher.join(timeout=2)
+        for process, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn in self._workers:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """共享的语音合成进程池（首次使用时启动）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TTSPool()
+            atexit.register(_pool.close)
+        return _pool